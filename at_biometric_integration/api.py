@@ -1,47 +1,133 @@
 # at_biometric_integration/api.py
 import frappe
-from .utils import biometric_sync, checkin_processing, attendance_processing, auto_submit, cleanup
+from .utils import biometric_sync, checkin_processing, attendance_processing, attendance_shards, auto_submit, cleanup, backfill
 from frappe import _
+from frappe.utils.background_jobs import get_job
+
+SYNC_JOB_ID = "biometric_sync_pipeline"
+SYNC_JOB_TIMEOUT = 60 * 60
+SYNC_PROGRESS_EVENT = "biometric_sync_progress"
+SYNC_STAGES = ["fetch", "checkins", "attendance", "auto_submit", "cleanup"]
+# RQ job states that mean the run has not finished yet
+SYNC_PENDING_STATES = ("queued", "deferred", "scheduled")
+SYNC_RUNNING_STATES = ("started",)
+
 
 @frappe.whitelist()
 def fetch_and_upload_attendance():
+    """
+    Queue the device sync pipeline (run_sync_pipeline) on the long queue and
+    return at once. There is only ever one run: while it is queued or running,
+    further calls return the same job id instead of starting another.
+
+    Progress is published as SYNC_PROGRESS_EVENT realtime events carrying the
+    job id, to the user who queued the run only. Returns {"job_id", "status",
+    "enqueued", "user"}: status is the RQ state of the run ("queued" while it
+    waits for a worker, "running" once a worker picked it up), enqueued
+    whether this call queued it, user who queued it (the one receiving the
+    progress events).
+    """
+    job = get_job(SYNC_JOB_ID)
+    state = job.get_status() if job else None
+    if state in SYNC_RUNNING_STATES + SYNC_PENDING_STATES:
+        return {
+            "job_id": SYNC_JOB_ID,
+            "status": "running" if state in SYNC_RUNNING_STATES else "queued",
+            "enqueued": False,
+            "user": get_sync_job_user(job),
+        }
+
+    frappe.enqueue(
+        "at_biometric_integration.api.run_sync_pipeline",
+        queue="long",
+        timeout=SYNC_JOB_TIMEOUT,
+        job_id=SYNC_JOB_ID,
+        deduplicate=True,
+        user=frappe.session.user,
+    )
+    return {"job_id": SYNC_JOB_ID, "status": "queued", "enqueued": True, "user": frappe.session.user}
+
+
+def get_sync_job_user(job):
+    """User the queued sync run publishes its progress to."""
+    # frappe.enqueue keeps the method's keyword arguments under "kwargs"
+    return ((getattr(job, "kwargs", None) or {}).get("kwargs") or {}).get("user")
+
+
+def publish_sync_progress(stage, message=None, result=None, user=None):
+    progress = SYNC_STAGES.index(stage) if stage in SYNC_STAGES else len(SYNC_STAGES)
+    frappe.publish_realtime(SYNC_PROGRESS_EVENT, user=user or frappe.session.user, message={
+        "job_id": SYNC_JOB_ID,
+        "stage": stage,
+        "progress": progress,
+        "total": len(SYNC_STAGES),
+        "message": message,
+        "result": result,
+    })
+
+
+def run_sync_pipeline(user=None):
+    """Background job behind fetch_and_upload_attendance; progress goes to ``user``."""
+    try:
+        return sync_devices_and_attendance(user)
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Biometric Sync")
+        publish_sync_progress("done", _("Sync failed"), {"errors": [str(e)]}, user=user)
+        raise
+
+
+def sync_devices_and_attendance(user=None):
     response = {
         "processed": [],
+        "devices": [],
         "created_checkins": [],
+        "checkin_batches": [],
         "created_attendance": [],
+        "attendance_stats": {"written": 0, "unchanged": 0},
         "submitted": [],
         "errors": []
     }
 
     devices = frappe.get_all(
         "Biometric Device Settings",
-        fields=["device_ip", "device_port"]
+        fields=["name", "device_ip", "device_port"]
     )
 
     if not devices:
         response["errors"].append("No biometric devices configured")
+        publish_sync_progress("done", _("No biometric devices configured"), response, user=user)
         return response
 
     # -------------------------
     # PHASE 1: DEVICE → JSON
     # -------------------------
-    for dev in devices:
-        ip = dev.device_ip
-        port = dev.device_port or 4370
+    # devices are contacted concurrently; the JSON writes stay sequential,
+    # in device order, on this thread
+    publish_sync_progress("fetch", _("Fetching logs from {0} device(s)").format(len(devices)), user=user)
+    for res in biometric_sync.fetch_from_devices(devices):
+        ip = res["device"]
+        summary = biometric_sync.fetch_summary(res)
+        summary["new_records"] = 0
 
-        try:
-            logs = biometric_sync.fetch_attendance_from_device(ip, port)
-            biometric_sync.process_attendance_logs(ip, logs)
-            response["processed"].append(ip)
-        except Exception as e:
-            frappe.log_error(str(e), "Biometric Sync")
-            response["errors"].append(f"{ip}: {e}")
+        if res["status"] == "ok":
+            try:
+                summary["new_records"] = len(biometric_sync.stage_fetch_result(res))
+                response["processed"].append(ip)
+            except Exception as e:
+                frappe.log_error(str(e), "Biometric Sync")
+                summary["status"] = "error"
+                summary["error"] = str(e)
+
+        if summary["status"] != "ok":
+            response["errors"].append(f"{ip}: {summary['error']}")
+        response["devices"].append(summary)
 
     # -------------------------
     # PHASE 2: JSON → CHECKINS
     # -------------------------
+    publish_sync_progress("checkins", _("Creating checkins"), user=user)
     try:
-        created = checkin_processing.create_frappe_checkins_from_devices(devices)
+        created = checkin_processing.create_frappe_checkins_from_devices(devices, reports=response["checkin_batches"])
         response["created_checkins"] = created
     except Exception as e:
         frappe.log_error(str(e), "Checkin Creation")
@@ -50,8 +136,9 @@ def fetch_and_upload_attendance():
     # -------------------------
     # PHASE 3: ATTENDANCE (ONCE)
     # -------------------------
+    publish_sync_progress("attendance", _("Processing attendance"), user=user)
     try:
-        created_att = attendance_processing.process_attendance_realtime()
+        created_att = attendance_processing.process_dirty_attendance(stats=response["attendance_stats"])
         if created_att:
             response["created_attendance"] = created_att
     except Exception as e:
@@ -61,6 +148,7 @@ def fetch_and_upload_attendance():
     # -------------------------
     # PHASE 4: AUTO SUBMIT
     # -------------------------
+    publish_sync_progress("auto_submit", _("Submitting due attendance"), user=user)
     try:
         submitted = auto_submit.auto_submit_due_attendances()
         if submitted:
@@ -71,55 +159,58 @@ def fetch_and_upload_attendance():
     # -------------------------
     # PHASE 5: CLEANUP
     # -------------------------
+    publish_sync_progress("cleanup", _("Cleaning up old logs"), user=user)
     cleanup.cleanup_old_attendance_logs()
 
+    publish_sync_progress("done", _("Sync complete"), {
+        "processed": response["processed"],
+        "devices": response["devices"],
+        "created_checkins": len(response["created_checkins"]),
+        "created_attendance": len(response["created_attendance"]),
+        "attendance_stats": response["attendance_stats"],
+        "submitted": len(response["submitted"]),
+        "errors": response["errors"],
+    }, user=user)
     return response
 
 
 @frappe.whitelist()
 def mark_attendance():
     """Backward-compatible endpoint"""
-    attendance_processing.process_attendance_realtime()
-    return {"message": "Marked attendance (realtime)"}
+    result = attendance_shards.recompute_attendance()
+    if result.get("run_id"):
+        return {
+            "message": _("Attendance recompute queued in {0} shards (run {1})").format(
+                result["shards"], result["run_id"]
+            )
+        }
+    return {
+        "message": _("Marked attendance (realtime): {0} written, {1} unchanged").format(
+            result.get("written", 0), result.get("unchanged", 0)
+        )
+    }
 
 
 @frappe.whitelist()
 def sync_all_biometric_data():
     """
     Sync ALL biometric data from all devices.
-    This ensures all check-in records are synced, including historical data.
+    Queues a resumable historical backfill per device (see utils.backfill),
+    limited to each device's Sync From / Sync To dates when set.
     """
-    response = {"processed": [], "created_checkins": [], "created_attendance": [], "errors": []}
-    
-    devices = frappe.get_all("Biometric Device Settings", fields=["device_ip", "device_port", "name"])
+    response = {"queued": [], "errors": []}
+
+    devices = frappe.get_all("Biometric Device Settings", fields=["device_ip", "name"])
     if not devices:
         response["errors"].append("No biometric devices configured.")
         return response
-    
+
     for dev in devices:
-        ip = dev.get("device_ip")
-        port = dev.get("device_port") or 4370
         try:
-            # Sync all historical data from device
-            new_records = biometric_sync.sync_all_historical_data(ip, port)
-            
-            # Create checkins from ALL JSON files (not just today's)
-            created = checkin_processing.create_frappe_checkins_from_devices([dev])
-            if created:
-                response["created_checkins"].extend(created)
-            
-            # Process attendance for all dates
-            processed = attendance_processing.process_attendance_realtime()
-            if processed:
-                response["created_attendance"].extend(processed)
-            
-            response["processed"].append({
-                "device": ip,
-                "new_records": len(new_records),
-                "created_checkins": len(created) if created else 0
-            })
+            backfill.enqueue_backfill(dev.name)
+            response["queued"].append(dev.get("device_ip"))
         except Exception as e:
-            frappe.log_error(e, f"sync_all_biometric_data - {ip}")
-            response["errors"].append(f"{ip}: {str(e)}")
-    
+            frappe.log_error(e, f"sync_all_biometric_data - {dev.get('device_ip')}")
+            response["errors"].append(f"{dev.get('device_ip')}: {str(e)}")
+
     return response
@@ -1,8 +1,17 @@
 // Copyright (c) 2025, Assimilate Technologies and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("Biometric Device Settings", {
-// 	refresh(frm) {
+frappe.ui.form.on("Biometric Device Settings", {
+	refresh(frm) {
+		if (frm.is_new() || !frm.doc.health_status) return;
 
-// 	},
-// });
+		const colors = { "Healthy": "green", "Degraded": "orange", "Circuit Open": "red" };
+		let message = __("Device health: {0}", [frm.doc.health_status]);
+		if (frm.doc.health_status === "Circuit Open" && frm.doc.health_next_retry_on) {
+			message += " · " + __("skipped until {0}", [frappe.datetime.str_to_user(frm.doc.health_next_retry_on)]);
+		} else if (frm.doc.health_last_success_on) {
+			message += " · " + __("last success {0}", [frappe.datetime.comment_when(frm.doc.health_last_success_on)]);
+		}
+		frm.dashboard.set_headline_alert(message, colors[frm.doc.health_status] || "gray");
+	},
+});
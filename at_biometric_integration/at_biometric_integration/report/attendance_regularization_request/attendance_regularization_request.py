@@ -6,7 +6,8 @@ from at_biometric_integration.utils.helpers import (
     calculate_working_hours, 
     determine_attendance_status, 
     get_leave_status, 
-    is_holiday
+    is_holiday,
+    load_leave_index
 )
 
 
@@ -128,6 +129,7 @@ def execute(filters=None):
             }))
 
     today_dt = datetime.now()
+    leave_index = load_leave_index(from_date, to_date, [filters.employee] if filters.get("employee") else None)
 
     for record in attendance_records:
         emp = record.employee
@@ -180,7 +182,7 @@ def execute(filters=None):
             working_hours_value = 0.0
 
         # ---------------- Get Leave & Holiday Info ----------------
-        leave_info = get_leave_status(emp, att_date) # (status, type, name)
+        leave_info = get_leave_status(emp, att_date, leave_index) # (status, type, name)
         holiday_flag = is_holiday(emp, att_date)
         
         # ---------------- Determine Status Dynamically ----------------
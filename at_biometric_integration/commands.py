@@ -0,0 +1,24 @@
+# at_biometric_integration/commands.py
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("biometric-listen")
+@click.option("--device", "devices", multiple=True, help="Biometric Device Settings name; repeat for several (default: all)")
+@click.option("--poll-interval", default=30, show_default=True, help="Seconds between polls for devices without live events")
+@pass_context
+def biometric_listen(context, devices, poll_interval):
+	"""Stream punches from biometric devices into Employee Checkin in real time"""
+	from at_biometric_integration.utils.live_capture import run_listener
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		run_listener(device_names=list(devices) or None, poll_interval=poll_interval)
+	finally:
+		frappe.destroy()
+
+
+commands = [biometric_listen]
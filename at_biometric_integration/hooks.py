@@ -155,6 +155,48 @@ doctype_list_js = {
 # 		"on_trash": "method"
 # 	}
 # }
+doc_events = {
+    "Employee": {
+        "after_insert": [
+            "at_biometric_integration.utils.employee_cache.invalidate",
+            "at_biometric_integration.utils.holiday_cache.invalidate"
+        ],
+        "on_update": [
+            "at_biometric_integration.utils.employee_cache.invalidate",
+            "at_biometric_integration.utils.holiday_cache.invalidate",
+            "at_biometric_integration.utils.dirty_attendance.on_employee_change"
+        ],
+        "on_trash": [
+            "at_biometric_integration.utils.employee_cache.invalidate",
+            "at_biometric_integration.utils.holiday_cache.invalidate"
+        ],
+        "after_rename": [
+            "at_biometric_integration.utils.employee_cache.invalidate",
+            "at_biometric_integration.utils.holiday_cache.invalidate"
+        ]
+    },
+    "Employee Checkin": {
+        "after_insert": "at_biometric_integration.utils.dirty_attendance.on_checkin_change",
+        "on_update": "at_biometric_integration.utils.dirty_attendance.on_checkin_change",
+        "on_trash": "at_biometric_integration.utils.dirty_attendance.on_checkin_change"
+    },
+    "Attendance Regularization": {
+        "on_submit": "at_biometric_integration.utils.dirty_attendance.on_regularization_change",
+        "on_cancel": "at_biometric_integration.utils.dirty_attendance.on_regularization_change"
+    },
+    "Leave Application": {
+        "on_submit": "at_biometric_integration.utils.dirty_attendance.on_leave_change",
+        "on_cancel": "at_biometric_integration.utils.dirty_attendance.on_leave_change"
+    },
+    "Holiday List": {
+        "on_update": [
+            "at_biometric_integration.utils.holiday_cache.invalidate",
+            "at_biometric_integration.utils.dirty_attendance.on_holiday_list_change"
+        ],
+        "on_trash": "at_biometric_integration.utils.holiday_cache.invalidate",
+        "after_rename": "at_biometric_integration.utils.holiday_cache.invalidate"
+    }
+}
 
 # Scheduled Tasks
 # ---------------
@@ -267,10 +309,12 @@ scheduler_events = {
         ]
     },
     "hourly": [
-        "at_biometric_integration.api.mark_attendance"
+        "at_biometric_integration.utils.backfill.resume_pending_backfills"
     ],
     "daily": [
-        "at_biometric_integration.utils.cleanup.cleanup_old_attendance_logs"
+        "at_biometric_integration.utils.attendance_shards.recompute_attendance",
+        "at_biometric_integration.utils.cleanup.cleanup_old_attendance_logs",
+        "at_biometric_integration.utils.cleanup.prune_punch_index"
     ]
 }
 
@@ -301,5 +345,5 @@ fixtures = [
     # }
     
 ]
-after_migrate = ["at_biometric_integration.patches.workflow_state_action.execute","at_biometric_integration.patches.create_biometric_roles_and_permissions.execute"]
+after_migrate = ["at_biometric_integration.patches.workflow_state_action.execute","at_biometric_integration.patches.create_biometric_roles_and_permissions.execute","at_biometric_integration.patches.add_employee_checkin_indexes.execute"]
 
@@ -0,0 +1,74 @@
+import frappe
+
+CHECKIN_INDEXES = {
+    # existing-checkin lookups of the biometric pipeline and per-employee
+    # attendance processing filter on employee and a time range
+    "employee_time_index": ["employee", "time"],
+}
+
+# one checkin per employee and second, the same key ingestion dedupes on;
+# checkin ingestion inserts with "ignore" against it
+CHECKIN_UNIQUE = ("unique_employee_time", ["employee", "time"])
+# earlier key: device_id is the device's record uid, so the same punch
+# fetched from two devices (or after a device clear) did not collide
+SUPERSEDED_UNIQUE = ["unique_employee_time_device"]
+DUPLICATES_LOGGED = 50
+
+
+def execute():
+    """Add the composite indexes the checkin pipeline relies on, then verify them."""
+    for index_name, columns in CHECKIN_INDEXES.items():
+        frappe.db.add_index("Employee Checkin", columns, index_name=index_name)
+        verify_index(index_name, columns)
+
+    add_unique_key(*CHECKIN_UNIQUE)
+    for index_name in SUPERSEDED_UNIQUE:
+        if frappe.db.has_index("tabEmployee Checkin", index_name):
+            frappe.db.sql_ddl(f"ALTER TABLE `tabEmployee Checkin` DROP INDEX `{index_name}`")
+    frappe.cache().delete_value("biometric_checkin_unique_key")
+
+
+def add_unique_key(constraint_name, columns):
+    if frappe.db.has_index("tabEmployee Checkin", constraint_name):
+        return
+
+    duplicates = frappe.db.sql(
+        f"""
+        SELECT {", ".join(f"`{c}`" for c in columns)}, COUNT(*) AS count,
+            GROUP_CONCAT(name ORDER BY name SEPARATOR ', ') AS names
+        FROM `tabEmployee Checkin`
+        WHERE {" AND ".join(f"`{c}` IS NOT NULL" for c in columns)}
+        GROUP BY {", ".join(f"`{c}`" for c in columns)}
+        HAVING COUNT(*) > 1
+        ORDER BY {", ".join(f"`{c}`" for c in columns)}
+        """,
+        as_dict=True
+    )
+    if duplicates:
+        # deleting checkins is not a migration's call; ingestion keeps
+        # reading before writing until the duplicates are cleaned up
+        lines = [
+            f"{', '.join(str(d[c]) for c in columns)}: {d['names']}"
+            for d in duplicates[:DUPLICATES_LOGGED]
+        ]
+        if len(duplicates) > DUPLICATES_LOGGED:
+            lines.append(f"... and {len(duplicates) - DUPLICATES_LOGGED} more")
+        frappe.log_error(
+            f"{len(duplicates)} duplicate ({', '.join(columns)}) groups in Employee Checkin; "
+            f"unique key {constraint_name} not added. Duplicate checkins:\n" + "\n".join(lines),
+            "Employee Checkin Index"
+        )
+        return
+
+    frappe.db.add_unique("Employee Checkin", columns, constraint_name=constraint_name)
+    verify_index(constraint_name, columns)
+
+
+def verify_index(index_name, columns):
+    if frappe.db.has_index("tabEmployee Checkin", index_name):
+        frappe.logger().info(f"Index {index_name} present on Employee Checkin")
+    else:
+        frappe.log_error(
+            f"Index {index_name} ({', '.join(columns)}) could not be created on Employee Checkin",
+            "Employee Checkin Index"
+        )
@@ -0,0 +1,9 @@
+import frappe
+
+from at_biometric_integration.utils.biometric_sync import migrate_legacy_files
+
+
+def execute():
+    # staging day files moved from one JSON list per file to append-only JSONL
+    migrated = migrate_legacy_files()
+    frappe.logger().info(f"Migrated {migrated} attendance staging file(s) to JSONL")
@@ -0,0 +1,11 @@
+import frappe
+
+from at_biometric_integration.utils import punch_index
+from at_biometric_integration.utils.biometric_sync import repartition_legacy_files
+
+
+def execute():
+    # staged punches moved from fetch-date day files to punch-date partitions
+    with punch_index.claim():
+        moved = repartition_legacy_files()
+    frappe.logger().info(f"Repartitioned {moved} attendance staging file(s) by punch date")
@@ -32,17 +32,28 @@ frappe.listview_settings['Employee Checkin'] = {
 
             // ------------------ SYNC BIOMETRIC DATA ------------------
             listview.page.add_inner_button(__('Sync Biometric Data'), () => {
-                show_progress_msg('Syncing biometric data in background...');
-
                 frappe.call({
                     method: "at_biometric_integration.api.fetch_and_upload_attendance",
-                    freeze: true,
                     callback: function (r) {
-                        frappe.hide_msgprint();
-                        if (r.message) show_result_message(r.message);
+                        if (!r.message) return;
+                        // progress events only go to the user who queued the run
+                        if (r.message.user && r.message.user !== frappe.session.user) {
+                            frappe.show_alert({
+                                message: __('Biometric sync started by {0} is already {1}.', [r.message.user, r.message.status]),
+                                indicator: 'blue'
+                            });
+                            return;
+                        }
+                        watch_sync_job(r.message.job_id);
+                        let message = __('Biometric sync queued in background.');
+                        if (r.message.status === 'running') {
+                            message = __('Biometric sync is already running.');
+                        } else if (!r.message.enqueued) {
+                            message = __('Biometric sync is already queued, waiting for a worker.');
+                        }
+                        frappe.show_alert({ message: message, indicator: 'blue' });
                     },
                     error: function (err) {
-                        frappe.hide_msgprint();
                         frappe.msgprint(__('❌ Error syncing biometric data.'));
                         console.error(err);
                     }
@@ -120,11 +131,37 @@ function show_progress_msg(msg) {
     frappe.msgprint({ title: __('Processing'), message: html, indicator: 'blue' });
 }
 
+// Follows the progress events of the background sync job until it is done
+function watch_sync_job(job_id) {
+    const event = 'biometric_sync_progress';
+    frappe.realtime.off(event);
+    frappe.realtime.on(event, (data) => {
+        if (data.job_id !== job_id) return;
+
+        if (data.stage === 'done') {
+            frappe.realtime.off(event);
+            frappe.hide_progress();
+            show_result_message(data.result || {});
+            cur_list && cur_list.refresh();
+            return;
+        }
+        frappe.show_progress(__('Syncing Biometric Data'), data.progress, data.total, data.message);
+    });
+}
+
 function show_result_message(data) {
     let msg = '';
     if (data.success && data.success.length > 0) {
         msg += `<b>✅ Success:</b><br>${data.success.join('<br>')}<br><br>`;
     }
+    if (data.processed && data.processed.length > 0) {
+        msg += `<b>✅ Devices synced:</b> ${data.processed.join(', ')}<br>`;
+        msg += `${__('Checkins created')}: ${data.created_checkins || 0}<br>`;
+        msg += `${__('Attendance created/updated')}: ${data.created_attendance || 0}`;
+        if (data.attendance_stats) msg += ` (${__('unchanged')}: ${data.attendance_stats.unchanged || 0})`;
+        msg += '<br>';
+        msg += `${__('Attendance submitted')}: ${data.submitted || 0}<br><br>`;
+    }
     if (data.errors && data.errors.length > 0) {
         msg += `<b>❌ Errors:</b><br>${data.errors.join('<br>')}`;
     }
@@ -4,28 +4,42 @@ from .utils import biometric_sync, checkin_processing, attendance_processing, au
 from frappe.utils import now
 
 def run_attendance_scheduler():
-    summary = {"time": now(), "devices": [], "created_checkins": 0, "created_attendance": 0, "submitted": 0, "errors": []}
+    summary = {"time": now(), "devices": [], "device_results": [], "checkin_batches": [], "created_checkins": 0, "created_attendance": 0, "attendance_written": 0, "attendance_unchanged": 0, "submitted": 0, "errors": []}
     devices = frappe.get_all("Biometric Device Settings", fields=["device_ip", "device_port", "name"])
     if not devices:
         return summary
 
-    for dev in devices:
-        ip = dev.get("device_ip")
-        port = dev.get("device_port") or 4370
+    for res in biometric_sync.fetch_from_devices(devices):
+        ip = res["device"]
+        summary["device_results"].append(biometric_sync.fetch_summary(res))
+        if res["status"] != "ok":
+            summary["errors"].append(f"{ip}: {res['error']}")
+            continue
         try:
-            logs = biometric_sync.fetch_attendance_from_device(ip, port)
-            if logs:
-                biometric_sync.process_attendance_logs(ip, logs)
-            created = checkin_processing.create_frappe_checkins_from_devices([dev])
-            summary["created_checkins"] += len(created)
-            # process today's attendance
-            processed = attendance_processing.process_attendance_realtime()
-            summary["created_attendance"] += len(processed)
+            biometric_sync.stage_fetch_result(res)
             summary["devices"].append(ip)
         except Exception as e:
             frappe.log_error(e, "run_attendance_scheduler")
             summary["errors"].append(str(e))
 
+    try:
+        created = checkin_processing.create_frappe_checkins_from_devices(devices, reports=summary["checkin_batches"])
+        summary["created_checkins"] += len(created)
+    except Exception as e:
+        frappe.log_error(e, "run_attendance_scheduler checkins")
+        summary["errors"].append(str(e))
+
+    # recompute the attendance whose inputs changed, once for all devices
+    try:
+        stats = {}
+        processed = attendance_processing.process_dirty_attendance(stats=stats)
+        summary["created_attendance"] += len(processed)
+        summary["attendance_written"] = stats.get("written", 0)
+        summary["attendance_unchanged"] = stats.get("unchanged", 0)
+    except Exception as e:
+        frappe.log_error(e, "run_attendance_scheduler attendance")
+        summary["errors"].append(str(e))
+
     # auto submit
     try:
         submitted = auto_submit.auto_submit_due_attendances()
@@ -0,0 +1,81 @@
+# at_biometric_integration/tests/benchmark_device_fetch.py
+"""
+Benchmark the device fetch paths against the ZK simulator.
+
+    python -m at_biometric_integration.tests.benchmark_device_fetch --records 100000
+    python -m at_biometric_integration.tests.benchmark_device_fetch --records 20000 --latency 0.005 --protocol udp
+
+Times a full download (device_client.fetch_device_logs), an
+incremental fetch with nothing new, an incremental fetch after a few new
+punches, and a drain-and-clear cycle.
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from at_biometric_integration.utils import device_client
+from .zk_simulator import ZKSimulator
+
+
+def _time(fn, repeat):
+    runs = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs), result
+
+
+def run_benchmark(records=100000, users=500, protocol="tcp", latency=0.0, packet_loss=0.0, new_punches=5, repeat=3):
+    rows = []
+    kwargs = {"ommit_ping": True, "force_udp": protocol == "udp", "timeout": 30}
+    with ZKSimulator(records=records, users=users, protocol=protocol, latency=latency, packet_loss=packet_loss) as sim:
+        ip, port = sim.address
+
+        elapsed, logs = _time(lambda: device_client.fetch_device_logs(ip, port, **kwargs), repeat)
+        rows.append(("full download", elapsed, len(logs)))
+
+        cursor = device_client.make_cursor(logs)
+        elapsed, res = _time(lambda: device_client.fetch_new_device_logs(ip, port, cursor=cursor, **kwargs), repeat)
+        rows.append(("incremental, unchanged", elapsed, len(res["logs"])))
+
+        last = sim.punches[-1].timestamp if sim.punches else datetime.now()
+        for i in range(new_punches):
+            sim.add_punch(sim.users[i % len(sim.users)][1], last + timedelta(minutes=i + 1))
+        elapsed, res = _time(lambda: device_client.fetch_new_device_logs(ip, port, cursor=cursor, **kwargs), repeat)
+        rows.append((f"incremental, {new_punches} new", elapsed, len(res["logs"])))
+
+        journal_dir = tempfile.mkdtemp()
+        try:
+            elapsed, res = _time(lambda: device_client.drain_device_logs(ip, port, journal_dir=journal_dir, **kwargs), 1)
+            rows.append(("drain and clear", elapsed, len(res["logs"])))
+        finally:
+            shutil.rmtree(journal_dir)
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--protocol", choices=["tcp", "udp"], default="tcp")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per reply")
+    parser.add_argument("--packet-loss", type=float, default=0.0)
+    parser.add_argument("--new-punches", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.records, args.users, args.protocol, args.latency, args.packet_loss,
+                         args.new_punches, args.repeat)
+    print(f"{'case':<28}{'seconds':>10}{'records':>10}")
+    for name, elapsed, count in rows:
+        print(f"{name:<28}{elapsed:>10.3f}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
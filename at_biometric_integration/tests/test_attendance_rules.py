@@ -0,0 +1,106 @@
+# at_biometric_integration/tests/test_attendance_rules.py
+from datetime import datetime
+
+import frappe
+from frappe.utils import add_days, getdate, today
+
+from at_biometric_integration.utils import attendance_processing
+from at_biometric_integration.utils.helpers import get_leave_status, load_leave_index
+from .utils import BiometricTestCase
+
+START = getdate("2026-03-02")
+
+
+def day(offset):
+    return add_days(START, offset)
+
+
+class TestLeaveLookup(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee(9501)
+
+    def make_leave(self, start, end, modified, half_day=0, status="Approved"):
+        """An approved Leave Application, written without the leave balance checks."""
+        leave = frappe.get_doc({
+            "doctype": "Leave Application", "employee": self.employee, "leave_type": "Casual Leave",
+            "from_date": day(start), "to_date": day(end), "half_day": half_day, "status": status,
+            "docstatus": 1, "posting_date": day(start),
+            "creation": datetime(2026, 2, 1), "modified": datetime(2026, 2, 1, 0, modified),
+        })
+        leave.db_insert()
+        return leave.name
+
+    def leave_on(self, offset):
+        index = load_leave_index(day(-5), day(40), [self.employee])
+        return get_leave_status(self.employee, day(offset), index)
+
+    def test_leave_covers_its_days(self):
+        leave = self.make_leave(0, 2, modified=0)
+        self.make_leave(5, 5, modified=0, half_day=1)
+        self.make_leave(8, 9, modified=0, status="Rejected")
+
+        self.assertEqual(self.leave_on(-1), (None, None, None))
+        self.assertEqual(self.leave_on(0), ("On Leave", "Casual Leave", leave))
+        self.assertEqual(self.leave_on(2)[2], leave)
+        self.assertEqual(self.leave_on(3), (None, None, None))
+        self.assertEqual(self.leave_on(5)[0], "Half Day")
+        self.assertEqual(self.leave_on(8), (None, None, None))
+
+    def test_long_leave_covers_the_days_after_a_nested_one(self):
+        long = self.make_leave(0, 20, modified=0)
+        short = self.make_leave(3, 4, modified=5)
+
+        self.assertEqual([self.leave_on(d)[2] for d in (1, 3, 4, 5, 10, 20, 21)], [long, short, short, long, long, long, None])
+
+    def test_latest_modified_wins_on_overlap(self):
+        first = self.make_leave(0, 5, modified=5)
+        second = self.make_leave(3, 8, modified=1)
+
+        self.assertEqual([self.leave_on(d)[2] for d in (2, 4, 7)], [first, first, second])
+
+    def test_index_agrees_with_the_query(self):
+        self.make_leave(0, 3, modified=0)
+        self.make_leave(10, 12, modified=0, half_day=1)
+        for offset in range(-1, 15):
+            self.assertEqual(self.leave_on(offset), get_leave_status(self.employee, day(offset)), offset)
+
+
+class TestAttendanceChangeDetection(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee(9502)
+        self.day = getdate(add_days(today(), -1))
+
+    def checkin(self, time, log_type):
+        frappe.get_doc({
+            "doctype": "Employee Checkin", "employee": self.employee, "time": f"{self.day} {time}", "log_type": log_type,
+        }).insert(ignore_permissions=True)
+
+    def recompute(self):
+        stats = {}
+        attendance_processing.process_employee_attendance_realtime(
+            self.employee, "", [], self.day, self.day, stats=stats
+        )
+        return stats
+
+    def attendance(self):
+        return frappe.get_all(
+            "Attendance", filters={"employee": self.employee, "attendance_date": self.day},
+            fields=["name", "in_time", "out_time", "modified"]
+        )
+
+    def test_recompute_only_writes_changes(self):
+        self.checkin("09:00:00", "IN")
+        self.checkin("17:00:00", "OUT")
+
+        self.assertEqual(self.recompute(), {"written": 1, "unchanged": 0})
+        (first,) = self.attendance()
+
+        self.assertEqual(self.recompute(), {"written": 0, "unchanged": 1})
+        (second,) = self.attendance()
+        self.assertEqual(second.modified, first.modified)
+
+        self.checkin("18:30:00", "OUT")
+        self.assertEqual(self.recompute(), {"written": 1, "unchanged": 0})
+        self.assertEqual(str(self.attendance()[0].out_time), f"{self.day} 18:30:00")
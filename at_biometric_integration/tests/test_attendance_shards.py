@@ -0,0 +1,59 @@
+# at_biometric_integration/tests/test_attendance_shards.py
+from unittest.mock import patch
+
+import frappe
+from frappe.utils import add_days, today
+
+from at_biometric_integration.utils import attendance_processing, attendance_shards
+from .utils import BiometricTestCase
+
+TO_DATE = today()
+FROM_DATE = add_days(TO_DATE, -1)
+
+
+class TestAttendanceShards(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employees = {self.make_employee(9300 + n) for n in range(12)}
+        recompute = patch.object(attendance_processing, "process_employee_attendance_realtime")
+        self.recompute = recompute.start()
+        self.addCleanup(recompute.stop)
+
+    def recomputed(self):
+        """Test employees recomputed so far, in call order."""
+        return [c.args[0] for c in self.recompute.call_args_list if c.args[0] in self.employees]
+
+    def run_shard(self, run_id, index, count):
+        return attendance_shards.run_shard(run_id, index, count, FROM_DATE, TO_DATE, reprocess_drafts=False)
+
+    def hold_shard_lock(self, index, count):
+        cache = frappe.cache()
+        lock = cache.lock(cache.make_key(f"{attendance_shards.LOCK_KEY}:{count}:{index}"), timeout=60)
+        self.assertTrue(lock.acquire(blocking=False))
+        self.addCleanup(lock.release)
+
+    def test_shards_recompute_every_employee_once(self):
+        for count in (1, 3, 8):
+            with self.subTest(count=count):
+                self.recompute.reset_mock()
+                run_id = frappe.generate_hash(length=10)
+                for index in range(count):
+                    self.assertEqual(self.run_shard(run_id, index, count)["status"], "ok")
+
+                self.assertCountEqual(self.recomputed(), self.employees)
+                summary = attendance_shards.get_run_summary(run_id)
+                self.assertEqual((summary["shards"], summary["locked"], summary["errors"]), (count, [], []))
+
+    def test_held_shard_is_skipped_and_reported(self):
+        self.hold_shard_lock(1, 4)
+        run_id = frappe.generate_hash(length=10)
+        results = [self.run_shard(run_id, index, 4) for index in range(4)]
+
+        self.assertEqual([r["status"] for r in results], ["ok", "locked", "ok", "ok"])
+        self.assertEqual(attendance_shards.get_run_summary(run_id)["locked"], [1])
+
+    def test_lock_is_per_shard_count(self):
+        # a 4-shard run holding shard 1 does not block shard 1 of an 8-shard run
+        self.hold_shard_lock(1, 4)
+        self.assertEqual(self.run_shard(frappe.generate_hash(length=10), 1, 8)["status"], "ok")
+        self.assertEqual(self.run_shard(frappe.generate_hash(length=10), 1, 4)["status"], "locked")
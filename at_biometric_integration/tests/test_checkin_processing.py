@@ -0,0 +1,83 @@
+# at_biometric_integration/tests/test_checkin_processing.py
+import frappe
+from frappe.utils import add_days, today
+
+from at_biometric_integration.utils import biometric_sync, checkin_processing
+from .utils import BiometricTestCase, device_log
+
+IP = "198.51.100.21"
+DAY = add_days(today(), -1)
+
+
+def checkin_times(employee):
+    return [
+        str(t) for t in frappe.get_all(
+            "Employee Checkin", filters={"employee": employee}, order_by="time asc", pluck="time"
+        )
+    ]
+
+
+class TestCheckinProcessing(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_staging(IP)
+        self.employee = self.make_employee(9101)
+
+    def stage(self, *logs):
+        biometric_sync.process_attendance_logs(IP, list(logs))
+
+    def run_pipeline(self):
+        reports = []
+        created = checkin_processing.create_frappe_checkins_from_devices([frappe._dict(device_ip=IP)], reports)
+        return created, reports
+
+    def assert_staged_punches_become_checkins_once(self):
+        self.stage(
+            device_log(9101, f"{DAY} 09:00:00", uid=1),
+            device_log(9101, f"{DAY} 18:00:00", uid=2, punch=1),
+            device_log(9999, f"{DAY} 09:10:00", uid=3),
+        )
+
+        created, reports = self.run_pipeline()
+
+        self.assertEqual(len(created), 2)
+        self.assertEqual(checkin_times(self.employee), [f"{DAY} 09:00:00", f"{DAY} 18:00:00"])
+        self.assertEqual(
+            frappe.get_all("Employee Checkin", filters={"name": ["in", created]}, order_by="time asc", pluck="log_type"),
+            ["IN", "OUT"],
+        )
+        self.assertEqual((reports[0]["inserted"], reports[0]["skipped_unmapped"]), (2, 1))
+
+        # the checkin cursor is past the staged records
+        self.assertEqual(self.run_pipeline()[0], [])
+
+    def test_bulk_insert(self):
+        self.set_sync_settings(bulk_checkin_insert=1)
+        self.assert_staged_punches_become_checkins_once()
+
+    def test_per_doc_insert(self):
+        self.set_sync_settings(bulk_checkin_insert=0)
+        self.assert_staged_punches_become_checkins_once()
+
+    def test_existing_checkin_is_skipped(self):
+        frappe.get_doc({
+            "doctype": "Employee Checkin", "employee": self.employee, "time": f"{DAY} 09:00:00", "log_type": "IN",
+        }).insert(ignore_permissions=True)
+        self.stage(device_log(9101, f"{DAY} 09:00:00"), device_log(9101, f"{DAY} 18:00:00"))
+
+        created, reports = self.run_pipeline()
+
+        self.assertEqual(len(created), 1)
+        self.assertEqual(reports[0]["skipped_existing"], 1)
+        self.assertEqual(checkin_times(self.employee), [f"{DAY} 09:00:00", f"{DAY} 18:00:00"])
+
+    def test_bulk_names_do_not_collide_with_later_inserts(self):
+        self.stage(*(device_log(9101, f"{DAY} 09:{minute:02d}:00") for minute in range(5)))
+        created, _ = self.run_pipeline()
+
+        later = frappe.get_doc({
+            "doctype": "Employee Checkin", "employee": self.employee, "time": f"{DAY} 19:00:00", "log_type": "OUT",
+        }).insert(ignore_permissions=True)
+
+        self.assertEqual(len(created), 5)
+        self.assertNotIn(later.name, created)
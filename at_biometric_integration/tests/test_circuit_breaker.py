@@ -0,0 +1,85 @@
+# at_biometric_integration/tests/test_circuit_breaker.py
+import socket
+
+import frappe
+from frappe.utils import add_to_date, get_datetime, now_datetime
+
+from at_biometric_integration.utils import biometric_sync
+from at_biometric_integration.utils.circuit_breaker import CIRCUIT_OPEN, DEGRADED, HEALTHY
+from .utils import BiometricTestCase
+
+
+def closed_port():
+    """A local port nothing listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestCircuitBreaker(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.set_sync_settings(device_failure_threshold=3, device_backoff_max=60)
+        self.skip_ping()
+
+    def fetch(self, device):
+        dev = frappe._dict(name=device.name, device_ip=device.device_ip, device_port=device.device_port)
+        return biometric_sync.fetch_from_devices([dev], deadline=10)[0]
+
+    def health(self, device):
+        return frappe.db.get_value(
+            "Biometric Device Settings", device.name,
+            ["health_status", "health_consecutive_failures", "health_next_retry_on"], as_dict=True
+        )
+
+    def assert_next_probe_in(self, device, minutes):
+        retry_on = get_datetime(self.health(device).health_next_retry_on)
+        expected = add_to_date(now_datetime(), minutes=minutes)
+        self.assertLess(abs((retry_on - expected).total_seconds()), 60)
+
+    def open_circuit(self, device, failures):
+        frappe.db.set_value("Biometric Device Settings", device.name, {
+            "health_status": CIRCUIT_OPEN,
+            "health_consecutive_failures": failures,
+            "health_next_retry_on": add_to_date(now_datetime(), minutes=-1),
+        }, update_modified=False)
+
+    def test_circuit_opens_at_the_threshold(self):
+        device = self.make_device("127.0.0.1", device_port=str(closed_port()))
+
+        for failures, status in ((1, DEGRADED), (2, DEGRADED), (3, CIRCUIT_OPEN)):
+            self.assertEqual(self.fetch(device)["status"], "error")
+            health = self.health(device)
+            self.assertEqual((health.health_consecutive_failures, health.health_status), (failures, status))
+        self.assert_next_probe_in(device, 5)
+
+        # not contacted until the probe is due
+        res = self.fetch(device)
+        self.assertEqual((res["status"], res["skipped"]), ("circuit_open", True))
+        self.assertEqual(self.health(device).health_consecutive_failures, 3)
+
+    def test_failed_probe_doubles_the_wait(self):
+        device = self.make_device("127.0.0.1", device_port=str(closed_port()))
+        self.open_circuit(device, failures=3)
+
+        self.assertEqual(self.fetch(device)["status"], "error")
+        self.assertEqual(self.health(device).health_consecutive_failures, 4)
+        self.assert_next_probe_in(device, 10)
+
+    def test_wait_is_capped(self):
+        device = self.make_device("127.0.0.1", device_port=str(closed_port()))
+        self.open_circuit(device, failures=20)
+
+        self.fetch(device)
+        self.assert_next_probe_in(device, 60)
+
+    def test_successful_probe_closes_the_circuit(self):
+        sim = self.start_simulator(records=4)
+        device = self.make_device(sim.host, device_port=str(sim.port))
+        self.open_circuit(device, failures=5)
+
+        res = self.fetch(device)
+        self.assertEqual((res["status"], res["records"]), ("ok", 4))
+        health = self.health(device)
+        self.assertEqual((health.health_status, health.health_consecutive_failures, health.health_next_retry_on),
+                         (HEALTHY, 0, None))
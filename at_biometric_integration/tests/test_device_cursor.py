@@ -0,0 +1,63 @@
+# at_biometric_integration/tests/test_device_cursor.py
+from datetime import datetime
+from unittest.mock import patch
+
+from zk import ZK
+
+from at_biometric_integration.utils import biometric_sync
+from .utils import BiometricTestCase, scheduled_fetch
+
+
+class TestDeviceCursor(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sim = self.start_simulator(records=10)
+        self.device = self.make_device(self.sim.host, device_port=str(self.sim.port))
+
+    def cursor(self):
+        return biometric_sync.get_device_cursors([self.device.name])[self.device.name]
+
+    def sync(self):
+        return scheduled_fetch(self.device, self.sim)
+
+    def test_only_new_records_are_downloaded(self):
+        _, staged = self.sync()
+        self.assertEqual(len(staged), 10)
+        self.assertEqual(self.cursor()["record_count"], 10)
+
+        self.sim.add_punch("3", datetime(2024, 1, 2, 9, 0, 0))
+        self.sim.add_punch("4", datetime(2024, 1, 2, 9, 1, 0))
+        res, staged = self.sync()
+        self.assertEqual([(r["user_id"], r["timestamp"]) for r in staged],
+                         [("3", "2024-01-02 09:00:00"), ("4", "2024-01-02 09:01:00")])
+        self.assertEqual(self.cursor()["record_count"], 12)
+
+        res, staged = self.sync()
+        self.assertTrue(res["skipped"])
+        self.assertEqual(self.cursor()["record_count"], 12)
+
+    def test_cleared_device_is_read_from_the_start(self):
+        self.sync()
+        conn = ZK(*self.sim.address, ommit_ping=True).connect()
+        conn.clear_attendance()
+        conn.disconnect()
+        for minute in range(3):
+            self.sim.add_punch("5", datetime(2024, 1, 2, 9, minute, 0))
+
+        _, staged = self.sync()
+        self.assertEqual(len(staged), 3)
+        self.assertEqual(self.cursor()["record_count"], 3)
+
+    def test_staging_failure_keeps_the_cursor(self):
+        self.sync()
+        self.sim.add_punch("3", datetime(2024, 1, 2, 9, 0, 0))
+
+        with patch.object(biometric_sync, "stage_records", side_effect=OSError("No space left on device")):
+            with self.assertRaises(OSError):
+                self.sync()
+        self.assertEqual(self.cursor()["record_count"], 10)
+
+        # the punch was neither staged nor claimed, so the next run picks it up
+        _, staged = self.sync()
+        self.assertEqual([r["timestamp"] for r in staged], ["2024-01-02 09:00:00"])
+        self.assertEqual(self.cursor()["record_count"], 11)
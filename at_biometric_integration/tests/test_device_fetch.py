@@ -0,0 +1,38 @@
+# at_biometric_integration/tests/test_device_fetch.py
+import frappe
+from frappe.utils import now_datetime
+
+from at_biometric_integration.utils import biometric_sync
+from .utils import BiometricTestCase
+
+
+class TestFetchDeadline(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.skip_ping()
+        # every reply takes 0.2s, so a fetch needs well over a second
+        self.sim = self.start_simulator(records=50, latency=0.2)
+        self.device = self.make_device(self.sim.host, device_port=str(self.sim.port))
+
+    def fetch(self, deadline):
+        dev = frappe._dict(name=self.device.name, device_ip=self.device.device_ip, device_port=self.device.device_port)
+        return biometric_sync.fetch_from_devices([dev], deadline=deadline)[0]
+
+    def test_first_download_has_no_deadline(self):
+        res = self.fetch(deadline=0.5)
+        self.assertEqual((res["status"], res["records"]), ("ok", 50))
+
+    def test_known_device_is_held_to_its_deadline(self):
+        frappe.db.set_value("Biometric Device Settings", self.device.name, {
+            "health_last_success_on": now_datetime(), "sync_record_count": 40,
+        }, update_modified=False)
+
+        res = self.fetch(deadline=0.5)
+        self.assertEqual(res["status"], "timeout")
+        self.assertIn("within 0.54s", res["error"])
+
+    def test_deadline_grows_with_the_buffer(self):
+        health = frappe._dict(health_last_success_on=now_datetime())
+        self.assertEqual(biometric_sync.device_deadline(30, {"record_count": 100_000}, health), 130)
+        self.assertEqual(biometric_sync.device_deadline(30, None, health), 30)
+        self.assertIsNone(biometric_sync.device_deadline(30, {"record_count": 100_000}, frappe._dict()))
@@ -0,0 +1,76 @@
+# at_biometric_integration/tests/test_dirty_attendance.py
+import frappe
+from frappe.utils import add_days, getdate
+
+from at_biometric_integration.utils import checkin_processing, dirty_attendance
+from .utils import BiometricTestCase
+
+TODAY = getdate()
+YESTERDAY = add_days(TODAY, -1)
+
+
+def dirty_pairs(key=dirty_attendance.DIRTY_KEY):
+    members = (m.decode() if isinstance(m, bytes) else m for m in frappe.cache().smembers(key))
+    return {(employee, getdate(date)) for employee, _, date in (m.rpartition("|") for m in members)}
+
+
+class TestDirtyAttendance(BiometricTestCase):
+    def test_future_dates_are_not_marked(self):
+        dirty_attendance.mark([("EMP-A", YESTERDAY), ("EMP-A", TODAY), ("EMP-A", add_days(TODAY, 1))])
+        self.assertEqual(dirty_pairs(), {("EMP-A", YESTERDAY), ("EMP-A", TODAY)})
+
+    def test_clean_claim_drops_the_pairs(self):
+        dirty_attendance.mark([("EMP-A", YESTERDAY)])
+        with dirty_attendance.claim() as pairs:
+            self.assertEqual(pairs, [("EMP-A", YESTERDAY)])
+        self.assertEqual(dirty_pairs(), set())
+        self.assertEqual(dirty_pairs(dirty_attendance.PROCESSING_KEY), set())
+
+    def test_failed_run_restores_the_pairs(self):
+        dirty_attendance.mark([("EMP-A", YESTERDAY), ("EMP-B", TODAY)])
+        with self.assertRaises(ValueError):
+            with dirty_attendance.claim():
+                raise ValueError("recompute failed")
+        self.assertEqual(dirty_pairs(), {("EMP-A", YESTERDAY), ("EMP-B", TODAY)})
+
+    def test_marks_during_a_run_wait_for_the_next(self):
+        dirty_attendance.mark([("EMP-A", YESTERDAY)])
+        with dirty_attendance.claim() as pairs:
+            dirty_attendance.mark([("EMP-B", TODAY)])
+            self.assertEqual(pairs, [("EMP-A", YESTERDAY)])
+        self.assertEqual(dirty_pairs(), {("EMP-B", TODAY)})
+
+    def test_held_run_lock_claims_nothing(self):
+        cache = frappe.cache()
+        lock = cache.lock(cache.make_key(dirty_attendance.RUN_LOCK_KEY), timeout=60)
+        self.assertTrue(lock.acquire(blocking=False))
+        self.addCleanup(lock.release)
+        dirty_attendance.mark([("EMP-A", YESTERDAY)])
+
+        with dirty_attendance.claim() as pairs:
+            self.assertEqual(pairs, [])
+        self.assertEqual(dirty_pairs(), {("EMP-A", YESTERDAY)})
+
+    def test_inserted_checkins_mark_their_day(self):
+        employee = self.make_employee(9201)
+        self.set_sync_settings(bulk_checkin_insert=1)
+
+        checkin_processing.create_checkins_from_records("198.51.100.31", [
+            {"user_id": "9201", "timestamp": f"{YESTERDAY} 09:00:00", "punch": 0, "uid": 1},
+        ])
+        self.assertEqual(dirty_pairs(), {(employee, YESTERDAY)})
+
+    def test_existing_checkins_do_not_mark_their_day(self):
+        employee = self.make_employee(9202)
+        day_before = add_days(YESTERDAY, -1)
+        frappe.get_doc({
+            "doctype": "Employee Checkin", "employee": employee, "time": f"{day_before} 09:00:00", "log_type": "IN",
+        }).insert(ignore_permissions=True)
+        frappe.cache().delete_key(dirty_attendance.DIRTY_KEY)
+        self.set_sync_settings(bulk_checkin_insert=1)
+
+        checkin_processing.create_checkins_from_records("198.51.100.31", [
+            {"user_id": "9202", "timestamp": f"{day_before} 09:00:00", "punch": 0, "uid": 1},
+            {"user_id": "9202", "timestamp": f"{YESTERDAY} 09:00:00", "punch": 0, "uid": 2},
+        ])
+        self.assertEqual(dirty_pairs(), {(employee, YESTERDAY)})
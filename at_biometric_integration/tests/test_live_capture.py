@@ -0,0 +1,52 @@
+# at_biometric_integration/tests/test_live_capture.py
+from datetime import datetime
+
+from at_biometric_integration.utils import biometric_sync, live_capture
+from at_biometric_integration.utils.device_client import make_cursor
+from .utils import BiometricTestCase, device_log, scheduled_fetch
+
+
+class TestLiveCapture(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sim = self.start_simulator(records=5)
+        self.device = self.make_device(self.sim.host, device_port=str(self.sim.port))
+
+    def saved_record_count(self):
+        return biometric_sync.get_device_cursors([self.device.name])[self.device.name]["record_count"]
+
+    def event(self, logs, cursor=None):
+        return {"device": self.device.device_ip, "name": self.device.name, "logs": logs, "cursor": cursor, "error": None}
+
+    def test_live_event_is_staged_without_moving_the_saved_cursor(self):
+        scheduled_fetch(self.device, self.sim)
+        cursors = biometric_sync.get_device_cursors([self.device.name])
+
+        live_capture.process_events([self.event([device_log(3, "2024-01-02 09:00:00", uid=3)])], cursors)
+
+        manifest = biometric_sync.load_manifest(self.device.device_ip)
+        self.assertEqual(manifest["2024-01-02"]["count"], 1)
+        self.assertEqual(self.saved_record_count(), 5)
+        self.assertEqual(cursors[self.device.name]["record_count"], 5)
+
+    def test_catch_up_moves_only_the_listener_cursor(self):
+        cursors = biometric_sync.get_device_cursors([self.device.name])
+        logs = [device_log(1, f"2024-01-01 08:0{i}:00", uid=i) for i in range(1, 6)]
+
+        live_capture.process_events([self.event(logs, cursor=make_cursor(logs))], cursors)
+
+        self.assertEqual(cursors[self.device.name]["record_count"], 5)
+        self.assertEqual(self.saved_record_count(), 0)
+
+    def test_punch_missed_before_listening_is_fetched_by_the_scheduler(self):
+        scheduled_fetch(self.device, self.sim)
+        cursors = biometric_sync.get_device_cursors([self.device.name])
+
+        # made after the listener's catch-up, before its live connection is up
+        self.sim.add_punch("3", datetime(2024, 1, 2, 9, 0, 0))
+        live = self.sim.add_punch("4", datetime(2024, 1, 2, 9, 5, 0))
+        live_capture.process_events([self.event([live])], cursors)
+
+        _, staged = scheduled_fetch(self.device, self.sim)
+        self.assertEqual([(r["user_id"], r["timestamp"]) for r in staged], [("3", "2024-01-02 09:00:00")])
+        self.assertEqual(self.saved_record_count(), 7)
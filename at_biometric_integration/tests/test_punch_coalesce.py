@@ -0,0 +1,82 @@
+# at_biometric_integration/tests/test_punch_coalesce.py
+from unittest.mock import patch
+
+import frappe
+from frappe.utils import add_days, today
+
+from at_biometric_integration.utils import biometric_sync, checkin_processing, live_capture
+from .utils import BiometricTestCase, device_log
+
+GATE, LOBBY = "198.51.100.41", "198.51.100.42"
+DAY = add_days(today(), -1)
+
+
+class TestPunchCoalesce(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_staging(GATE)
+        self.use_staging(LOBBY)
+        self.employee = self.make_employee(9401)
+        self.set_sync_settings(punch_coalesce_window=10)
+        log = patch.object(checkin_processing, "log_coalesced_punches")
+        self.log = log.start()
+        self.addCleanup(log.stop)
+
+    def stage(self, ip, *times):
+        biometric_sync.process_attendance_logs(ip, [device_log(9401, f"{DAY} {t}") for t in times])
+
+    def run_pipeline(self):
+        reports = []
+        devices = [frappe._dict(device_ip=GATE), frappe._dict(device_ip=LOBBY)]
+        checkin_processing.create_frappe_checkins_from_devices(devices, reports)
+        return {r["device"]: r for r in reports}
+
+    def checkins(self):
+        return frappe.get_all(
+            "Employee Checkin", filters={"employee": self.employee}, fields=["time", "device_ip"], order_by="time asc"
+        )
+
+    def test_one_swipe_on_two_devices_is_one_checkin(self):
+        self.stage(GATE, "09:00:00")
+        self.stage(LOBBY, "09:00:04")
+
+        reports = self.run_pipeline()
+
+        self.assertEqual([(str(c.time), c.device_ip) for c in self.checkins()], [(f"{DAY} 09:00:00", GATE)])
+        self.assertEqual((reports[GATE]["coalesced"], reports[LOBBY]["coalesced"]), (0, 1))
+        (kept, dropped), = self.log.call_args.args[1]
+        self.assertEqual((kept["device_ip"], dropped["device_ip"]), (GATE, LOBBY))
+
+    def test_punches_outside_the_window_are_kept(self):
+        self.stage(GATE, "09:00:00")
+        self.stage(LOBBY, "09:00:11")
+
+        self.run_pipeline()
+
+        self.assertEqual(len(self.checkins()), 2)
+
+    def test_window_off(self):
+        self.set_sync_settings(punch_coalesce_window=0)
+        self.stage(GATE, "09:00:00")
+        self.stage(LOBBY, "09:00:04")
+
+        self.run_pipeline()
+
+        self.assertEqual(len(self.checkins()), 2)
+
+    def test_copy_of_a_repeat_joins_the_repeat(self):
+        # two swipes on the gate; the lobby saw the second one
+        self.stage(GATE, "09:00:00", "09:00:06")
+        self.stage(LOBBY, "09:00:08")
+
+        self.run_pipeline()
+
+        self.assertEqual([str(c.time) for c in self.checkins()], [f"{DAY} 09:00:00", f"{DAY} 09:00:06"])
+
+    def test_live_listener_batch_is_coalesced(self):
+        def event(ip, time):
+            return {"device": ip, "name": None, "logs": [device_log(9401, f"{DAY} {time}")], "cursor": None, "error": None}
+
+        live_capture.process_events([event(GATE, "09:00:00"), event(LOBBY, "09:00:03")], {})
+
+        self.assertEqual([c.device_ip for c in self.checkins()], [GATE])
@@ -0,0 +1,83 @@
+# at_biometric_integration/tests/test_staging.py
+from at_biometric_integration.utils import biometric_sync
+from .utils import BiometricTestCase, device_log
+
+IP = "198.51.100.11"
+
+
+def staged(ip, date):
+    return [
+        (r["user_id"], r["timestamp"])
+        for r in biometric_sync.iter_attendance_records(biometric_sync.get_attendance_file_path(ip, date))
+    ]
+
+
+class TestStaging(BiometricTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_staging(IP)
+
+    def test_punches_are_partitioned_by_punch_date(self):
+        biometric_sync.process_attendance_logs(IP, [
+            device_log(1, "2026-10-01 09:00:00", uid=1),
+            device_log(1, "2026-10-01 18:05:00", uid=2),
+            device_log(2, "2026-10-02 08:30:00", uid=3),
+        ])
+
+        self.assertEqual(staged(IP, "2026-10-01"), [("1", "2026-10-01 09:00:00"), ("1", "2026-10-01 18:05:00")])
+        self.assertEqual(staged(IP, "2026-10-02"), [("2", "2026-10-02 08:30:00")])
+
+        manifest = biometric_sync.load_manifest(IP)
+        self.assertEqual(sorted(manifest), ["2026-10-01", "2026-10-02"])
+        self.assertEqual(
+            (manifest["2026-10-01"]["count"], manifest["2026-10-01"]["min_time"], manifest["2026-10-01"]["max_time"]),
+            (2, "2026-10-01 09:00:00", "2026-10-01 18:05:00"),
+        )
+
+    def test_a_punch_is_staged_once(self):
+        first = biometric_sync.process_attendance_logs(IP, [device_log(1, "2026-10-01 09:00:00")])
+        # the device returns its whole buffer again, plus one new punch
+        second = biometric_sync.process_attendance_logs(IP, [
+            device_log(1, "2026-10-01 09:00:00"),
+            device_log(1, "2026-10-01 09:00:00"),
+            device_log(1, "2026-10-01 12:00:00"),
+        ])
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual([r["timestamp"] for r in second], ["2026-10-01 12:00:00"])
+        self.assertEqual(len(staged(IP, "2026-10-01")), 2)
+        self.assertEqual(biometric_sync.load_manifest(IP)["2026-10-01"]["count"], 2)
+
+    def test_checkin_cursor_only_sees_new_records(self):
+        biometric_sync.process_attendance_logs(IP, [
+            device_log(1, "2026-10-01 09:00:00"), device_log(1, "2026-10-02 09:00:00"),
+        ])
+        cursor = {}
+        for date, offset in biometric_sync.get_pending_partitions(IP, cursor).items():
+            records, cursor[date] = biometric_sync.read_attendance_records(
+                biometric_sync.get_attendance_file_path(IP, date), offset
+            )
+            self.assertEqual(len(records), 1)
+        self.assertEqual(biometric_sync.get_pending_partitions(IP, cursor), {})
+
+        biometric_sync.process_attendance_logs(IP, [device_log(1, "2026-10-02 18:00:00")])
+        pending = biometric_sync.get_pending_partitions(IP, cursor)
+        self.assertEqual(pending, {"2026-10-02": cursor["2026-10-02"]})
+        records, _ = biometric_sync.read_attendance_records(
+            biometric_sync.get_attendance_file_path(IP, "2026-10-02"), pending["2026-10-02"]
+        )
+        self.assertEqual([r["timestamp"] for r in records], ["2026-10-02 18:00:00"])
+
+    def test_torn_last_line_is_left_for_the_next_read(self):
+        biometric_sync.process_attendance_logs(IP, [device_log(1, "2026-10-01 09:00:00")])
+        path = biometric_sync.get_attendance_file_path(IP, "2026-10-01")
+        with open(path, "a") as f:
+            f.write('{"user_id": "1", "timestamp": "2026-10-01 1')
+
+        records, offset = biometric_sync.read_attendance_records(path)
+        self.assertEqual(len(records), 1)
+
+        # the next append starts on a fresh line and the torn one is skipped
+        biometric_sync.process_attendance_logs(IP, [device_log(1, "2026-10-01 12:00:00")])
+        records, _ = biometric_sync.read_attendance_records(path, offset)
+        self.assertEqual([r["timestamp"] for r in records], ["2026-10-01 12:00:00"])
@@ -0,0 +1,34 @@
+# at_biometric_integration/tests/test_sync_api.py
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+
+from at_biometric_integration import api
+from .utils import BiometricTestCase
+
+OWNER = "biometric-sync-owner@example.com"
+
+
+class TestSyncApi(BiometricTestCase):
+    def test_run_is_queued_for_the_calling_user(self):
+        with patch.object(api, "get_job", return_value=None), patch.object(frappe, "enqueue") as enqueue:
+            res = api.fetch_and_upload_attendance()
+
+        self.assertEqual((res["status"], res["enqueued"], res["user"]), ("queued", True, frappe.session.user))
+        self.assertEqual(enqueue.call_args.kwargs["user"], frappe.session.user)
+
+    def test_running_job_reports_its_owner(self):
+        job = SimpleNamespace(get_status=lambda: "started", kwargs={"kwargs": {"user": OWNER}})
+        with patch.object(api, "get_job", return_value=job), patch.object(frappe, "enqueue") as enqueue:
+            res = api.fetch_and_upload_attendance()
+
+        self.assertEqual((res["status"], res["enqueued"], res["user"]), ("running", False, OWNER))
+        enqueue.assert_not_called()
+
+    def test_progress_goes_to_the_owner(self):
+        with patch.object(frappe, "publish_realtime") as publish:
+            api.publish_sync_progress("checkins", "Creating checkins", user=OWNER)
+
+        self.assertEqual(publish.call_args.kwargs["user"], OWNER)
+        self.assertEqual(publish.call_args.kwargs["message"]["stage"], "checkins")
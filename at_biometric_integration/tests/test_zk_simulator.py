@@ -0,0 +1,81 @@
+# at_biometric_integration/tests/test_zk_simulator.py
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from zk import ZK
+from zk.exception import ZKErrorResponse, ZKNetworkError
+
+from at_biometric_integration.utils import device_client
+from .utils import BiometricTestCase
+
+
+def connect(sim, timeout=5):
+    return ZK(*sim.address, timeout=timeout, ommit_ping=True, force_udp=sim.protocol == "udp").connect()
+
+
+class TestZKSimulator(BiometricTestCase):
+    def test_download_and_clear(self):
+        for protocol in ("tcp", "udp"):
+            with self.subTest(protocol=protocol):
+                sim = self.start_simulator(records=250, protocol=protocol)
+                conn = connect(sim)
+                conn.read_sizes()
+                self.assertEqual((conn.users, conn.records), (50, 250))
+
+                logs = conn.get_attendance()
+                self.assertEqual(len(logs), 250)
+                self.assertEqual(logs[0].timestamp, sim.punches[0].timestamp)
+                self.assertEqual(len(conn.get_users()), 50)
+
+                conn.clear_attendance()
+                conn.read_sizes()
+                self.assertEqual(conn.records, 0)
+                conn.disconnect()
+
+    def test_live_capture(self):
+        sim = self.start_simulator(records=3)
+        conn = connect(sim)
+        punch_time = datetime(2026, 1, 1, 9, 0, 0)
+        threading.Timer(0.3, sim.add_punch, args=("7", punch_time)).start()
+
+        started = time.monotonic()
+        event = None
+        for att in conn.live_capture(new_timeout=1):
+            if att is not None or time.monotonic() - started > 5:
+                event = att
+                conn.end_live_capture = True
+        conn.disconnect()
+
+        self.assertIsNotNone(event)
+        self.assertEqual((event.user_id, event.timestamp), ("7", punch_time))
+
+    def test_live_capture_unsupported(self):
+        conn = connect(self.start_simulator(records=3, live_events=False))
+        with self.assertRaises(ZKErrorResponse):
+            next(conn.live_capture(new_timeout=1))
+
+    def test_disconnect(self):
+        conn = connect(self.start_simulator(records=3, disconnect_after=2), timeout=2)
+        with self.assertRaises(ZKNetworkError):
+            conn.get_attendance()
+
+
+class TestDeviceClient(BiometricTestCase):
+    def test_full_download(self):
+        sim = self.start_simulator(records=100)
+        self.assertEqual(len(device_client.fetch_device_logs(*sim.address, ommit_ping=True)), 100)
+
+    def test_drain(self):
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        sim = self.start_simulator(records=20)
+        res = device_client.drain_device_logs(*sim.address, journal_dir=journal_dir, ommit_ping=True)
+        self.assertEqual(len(res["logs"]), 20)
+        self.assertEqual((len(sim.punches), sim.clears, sim.enabled), (0, 1, True))
+        self.assertTrue(res["journal"].endswith(".cleared.jsonl"))
+        self.assertEqual(len(device_client.read_journal(res["journal"])), 20)
+        self.assertEqual(os.listdir(journal_dir), [os.path.basename(res["journal"])])
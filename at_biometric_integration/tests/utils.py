@@ -0,0 +1,96 @@
+# at_biometric_integration/tests/utils.py
+"""Shared setup for the app's tests (bench run-tests --app at_biometric_integration)."""
+import shutil
+from datetime import datetime
+from functools import partial
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from at_biometric_integration.utils import (
+    biometric_sync, device_client, dirty_attendance, employee_cache, holiday_cache, punch_index,
+)
+
+from .zk_simulator import ZKSimulator
+
+
+class BiometricTestCase(FrappeTestCase):
+    """
+    The pipeline commits as it goes; here commit is a no-op and every test is
+    rolled back, and the staging files and punch index rows of the devices a
+    test creates are removed.
+    """
+
+    def setUp(self):
+        super().setUp()
+        commit = patch.object(frappe.local.db, "commit")
+        commit.start()
+        self.addCleanup(commit.stop)
+        self.addCleanup(self.reset_caches)
+        self.addCleanup(frappe.db.rollback)
+
+    @staticmethod
+    def reset_caches():
+        # rolled back employees, holiday lists and their dirty marks must not linger in Redis
+        employee_cache.invalidate()
+        holiday_cache.invalidate()
+        cache = frappe.cache()
+        cache.delete(cache.make_key(dirty_attendance.DIRTY_KEY), cache.make_key(dirty_attendance.PROCESSING_KEY))
+
+    def use_staging(self, ip):
+        """Start ``ip`` with empty staging and remove what the test stages."""
+        clear_staging(ip)
+        self.addCleanup(clear_staging, ip)
+
+    def start_simulator(self, **kwargs):
+        """A running ZKSimulator, stopped when the test ends."""
+        sim = ZKSimulator(**kwargs).start()
+        self.addCleanup(sim.stop)
+        return sim
+
+    def skip_ping(self):
+        """Connect without pyzk's ping, which shells out to the system ping, for the fetch stage."""
+        connect = patch.object(device_client, "connect_device", partial(device_client.connect_device, ommit_ping=True))
+        connect.start()
+        self.addCleanup(connect.stop)
+
+    def make_device(self, ip, **values):
+        device = frappe.get_doc(dict(
+            {"doctype": "Biometric Device Settings", "device_name": f"Test {ip}", "device_ip": ip, "device_port": "4370"},
+            **values
+        )).insert(ignore_permissions=True)
+        self.use_staging(ip)
+        return device
+
+    def make_employee(self, device_user_id, **values):
+        from erpnext.setup.doctype.employee.test_employee import make_employee
+
+        return make_employee(f"biometric-{device_user_id}@example.com", attendance_device_id=str(device_user_id), **values)
+
+    def set_sync_settings(self, **values):
+        for field, value in values.items():
+            frappe.db.set_single_value("Attendance Settings", field, value)
+
+
+def clear_staging(ip):
+    shutil.rmtree(biometric_sync.get_partition_dir(ip), ignore_errors=True)
+    conn = punch_index._connect()
+    conn.execute("DELETE FROM punch WHERE device = ?", (ip,))
+
+
+def scheduled_fetch(device, sim):
+    """One incremental fetch of ``device`` (served by ``sim``) as the scheduler runs it; returns (result, staged records)."""
+    cursor = biometric_sync.get_device_cursors([device.name]).get(device.name)
+    res = device_client.fetch_new_device_logs(*sim.address, cursor=cursor, ommit_ping=True)
+    res.update(device=device.device_ip, name=device.name)
+    return res, biometric_sync.stage_fetch_result(res)
+
+
+def device_log(user_id, timestamp, uid=None, punch=0):
+    """A pyzk Attendance-like log; ``timestamp`` as "YYYY-MM-DD HH:MM:SS"."""
+    return SimpleNamespace(
+        uid=uid, user_id=str(user_id), punch=punch,
+        timestamp=datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S"),
+    )
@@ -0,0 +1,380 @@
+# at_biometric_integration/tests/zk_simulator.py
+"""
+Local ZK protocol device simulator.
+
+Speaks enough of the ZKTeco TCP/UDP protocol for pyzk to connect, read sizes,
+download users and attendance (buffered, chunked reads), clear the log,
+enable/disable the device and receive live capture events. No hardware and
+no frappe needed, so it backs both the tests and the fetch benchmarks.
+
+    with ZKSimulator(records=100_000, latency=0.002) as sim:
+        conn = ZK(*sim.address, ommit_ping=True).connect()
+        logs = conn.get_attendance()
+
+Knobs:
+    records / users      size of the generated punch buffer and user table
+    protocol             "tcp" or "udp"
+    latency              seconds slept before every reply
+    packet_loss          probability a reply is dropped (UDP) or delayed by a
+                         retransmit timeout (TCP)
+    disconnect_after     drop the connection after this many commands
+    live_events          False makes CMD_REG_EVENT fail, like old firmware
+"""
+import random
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from struct import pack, unpack
+
+from zk import const
+
+CMD_PREPARE_BUFFER = 1503
+CMD_READ_BUFFER = 1504
+USER_PACKET_SIZE = 72
+ATT_PACKET_SIZE = 40
+UDP_DATA_CHUNK = 1024
+TCP_RETRANSMIT_DELAY = 0.2
+
+
+def encode_time(t):
+    """ZK timestamp encoding (inverse of pyzk's __decode_time)."""
+    return (
+        ((t.year % 100) * 12 * 31 + ((t.month - 1) * 31) + t.day - 1) * (24 * 60 * 60)
+        + (t.hour * 60 + t.minute) * 60 + t.second
+    )
+
+
+def checksum(p):
+    total = 0
+    for i in range(0, len(p) - 1, 2):
+        total += p[i] | (p[i + 1] << 8)
+        if total > const.USHRT_MAX:
+            total -= const.USHRT_MAX
+    if len(p) % 2:
+        total += p[-1]
+    while total > const.USHRT_MAX:
+        total -= const.USHRT_MAX
+    total = ~total
+    while total < 0:
+        total += const.USHRT_MAX
+    return total
+
+
+def make_packet(command, session_id, reply_id, data=b""):
+    head = pack("<4H", command, 0, session_id, reply_id) + data
+    return pack("<4H", command, checksum(head), session_id, reply_id) + data
+
+
+def tcp_top(packet):
+    return pack("<HHI", const.MACHINE_PREPARE_DATA_1, const.MACHINE_PREPARE_DATA_2, len(packet)) + packet
+
+
+class Punch:
+    __slots__ = ("uid", "user_id", "timestamp", "status", "punch")
+
+    def __init__(self, uid, user_id, timestamp, status=1, punch=0):
+        self.uid = uid
+        self.user_id = str(user_id)
+        self.timestamp = timestamp
+        self.status = status
+        self.punch = punch
+
+    def encode(self):
+        return pack(
+            "<H24sB4sB8s", self.uid, self.user_id.encode(), self.status,
+            pack("<I", encode_time(self.timestamp)), self.punch, b""
+        )
+
+
+class _Session:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.reply_id = 0
+        self.commands = 0
+        self.buffer = b""
+        self.live = False
+
+
+class ZKSimulator:
+    def __init__(self, host="127.0.0.1", port=0, protocol="tcp", records=0, users=50,
+                 start=None, step=timedelta(seconds=37), latency=0.0, packet_loss=0.0,
+                 disconnect_after=None, live_events=True, seed=0):
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.latency = latency
+        self.packet_loss = packet_loss
+        self.disconnect_after = disconnect_after
+        self.live_events = live_events
+        self.random = random.Random(seed)
+
+        self.lock = threading.RLock()
+        self.users = [(uid, str(uid), f"User {uid}") for uid in range(1, users + 1)]
+        self.punches = []
+        self.held = []          # punches made while the device is disabled
+        self.enabled = True
+        self.clears = 0
+        self.commands = {}
+        self.live_clients = []  # (send callable, session)
+        self._att_blob = None
+
+        start = start or datetime(2024, 1, 1, 8, 0, 0)
+        for i in range(records):
+            uid, user_id, _ = self.users[i % users]
+            self.punches.append(Punch(uid, user_id, start + step * i, punch=i % 2))
+
+        self.server = None
+        self.thread = None
+
+    # ----------------------------------------------------------------- control
+    @property
+    def address(self):
+        return (self.host, self.port)
+
+    def start(self):
+        sim = self
+        if self.protocol == "udp":
+            class Handler(socketserver.BaseRequestHandler):
+                def handle(self):
+                    sim._handle_udp(self.request[0], self.request[1], self.client_address)
+            server_cls = socketserver.ThreadingUDPServer
+        else:
+            class Handler(socketserver.BaseRequestHandler):
+                def handle(self):
+                    sim._handle_tcp(self.request)
+            server_cls = socketserver.ThreadingTCPServer
+
+        server_cls.allow_reuse_address = True
+        server_cls.daemon_threads = True
+        self.server = server_cls((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.udp_sessions = {}
+        self.thread = threading.Thread(target=self.server.serve_forever, name="zk-simulator", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add_punch(self, user_id, timestamp=None, punch=0, status=1):
+        """Record a punch; live capture clients get it as an event."""
+        user = next((u for u in self.users if u[1] == str(user_id)), None)
+        uid = user[0] if user else int(user_id)
+        rec = Punch(uid, user_id, timestamp or datetime.now().replace(microsecond=0), status, punch)
+        with self.lock:
+            if not self.enabled:
+                self.held.append(rec)
+                return rec
+            self._store(rec)
+        return rec
+
+    def _store(self, rec):
+        self.punches.append(rec)
+        self._att_blob = None
+        event = pack("<IBB6s", int(rec.user_id), rec.status, rec.punch, pack(
+            "6B", rec.timestamp.year - 2000, rec.timestamp.month, rec.timestamp.day,
+            rec.timestamp.hour, rec.timestamp.minute, rec.timestamp.second
+        ))
+        for send, session in list(self.live_clients):
+            try:
+                send(make_packet(const.CMD_REG_EVENT, session.session_id, 0, event))
+            except OSError:
+                self.live_clients.remove((send, session))
+
+    # ------------------------------------------------------------- payloads
+    def _sizes(self):
+        fields = [0] * 20
+        fields[4] = len(self.users)
+        fields[8] = len(self.punches)
+        fields[14] = 3000
+        fields[15] = 10000
+        fields[16] = 200000
+        fields[19] = 200000 - len(self.punches)
+        return pack("20i", *fields) + pack("3i", 0, 0, 0)
+
+    def _user_blob(self):
+        body = b"".join(
+            pack("<HB8s24sIx7sx24s", uid, 0, b"", name.encode(), 0, b"1", user_id.encode())
+            for uid, user_id, name in self.users
+        )
+        return pack("I", len(body)) + body
+
+    def _attendance_blob(self):
+        if self._att_blob is None:
+            body = b"".join(p.encode() for p in self.punches)
+            self._att_blob = pack("I", len(body)) + body
+        return self._att_blob
+
+    # -------------------------------------------------------------- dispatch
+    def _dispatch(self, session, command, data):
+        """Return a list of (command, payload) replies; [] means no reply."""
+        with self.lock:
+            self.commands[command] = self.commands.get(command, 0) + 1
+
+            if command == const.CMD_ACK_OK:          # client acking a live event
+                return []
+            if command == const.CMD_CONNECT:
+                return [(const.CMD_ACK_OK, b"")]
+            if command == const.CMD_EXIT:
+                session.live = False
+                return [(const.CMD_ACK_OK, b"")]
+            if command == const.CMD_GET_FREE_SIZES:
+                return [(const.CMD_ACK_OK, self._sizes())]
+            if command == CMD_PREPARE_BUFFER:
+                _, sub, _fct, _ext = unpack("<bhii", data[:11])
+                if sub == const.CMD_ATTLOG_RRQ:
+                    session.buffer = self._attendance_blob()
+                elif sub == const.CMD_USERTEMP_RRQ:
+                    session.buffer = self._user_blob()
+                else:
+                    return [(const.CMD_ACK_ERROR, b"")]
+                return [(const.CMD_ACK_OK, b"\x00" + pack("<I", len(session.buffer)) + b"\x00" * 4)]
+            if command == CMD_READ_BUFFER:
+                start, size = unpack("<ii", data[:8])
+                return [("chunk", session.buffer[start:start + size])]
+            if command == const.CMD_FREE_DATA:
+                session.buffer = b""
+                return [(const.CMD_ACK_OK, b"")]
+            if command == const.CMD_CLEAR_ATTLOG:
+                self.punches = []
+                self._att_blob = None
+                self.clears += 1
+                return [(const.CMD_ACK_OK, b"")]
+            if command == const.CMD_DISABLEDEVICE:
+                self.enabled = False
+                return [(const.CMD_ACK_OK, b"")]
+            if command == const.CMD_ENABLEDEVICE:
+                self.enabled = True
+                held, self.held = self.held, []
+                for rec in held:
+                    self._store(rec)
+                return [(const.CMD_ACK_OK, b"")]
+            if command == const.CMD_REG_EVENT:
+                flags = unpack("<I", data[:4])[0] if len(data) >= 4 else 0
+                if flags and not self.live_events:
+                    return [(const.CMD_ACK_ERROR, b"")]
+                session.live = bool(flags)
+                return [(const.CMD_ACK_OK, b"")]
+            if command in (const.CMD_CANCELCAPTURE, const.CMD_STARTVERIFY, const.CMD_REFRESHDATA):
+                return [(const.CMD_ACK_OK, b"")]
+            if command == const.CMD_GET_VERSION:
+                return [(const.CMD_ACK_OK, b"Ver 6.60 Sim\x00")]
+            return [(const.CMD_ACK_UNKNOWN, b"")]
+
+    def _should_drop(self, session):
+        session.commands += 1
+        return self.disconnect_after is not None and session.commands > self.disconnect_after
+
+    def _lossy(self):
+        return self.packet_loss and self.random.random() < self.packet_loss
+
+    # ------------------------------------------------------------------ TCP
+    def _handle_tcp(self, sock):
+        session = _Session(self.random.randint(1, 0xFFFE))
+        send_lock = threading.Lock()
+
+        def send(packet):
+            with send_lock:
+                sock.sendall(tcp_top(packet))
+
+        def recv_exact(n):
+            buf = b""
+            while len(buf) < n:
+                part = sock.recv(n - len(buf))
+                if not part:
+                    return None
+                buf += part
+            return buf
+
+        try:
+            while True:
+                top = recv_exact(8)
+                if not top:
+                    return
+                _, _, length = unpack("<HHI", top)
+                packet = recv_exact(length)
+                if packet is None:
+                    return
+                command, _, _, reply_id = unpack("<4H", packet[:8])
+                if self._should_drop(session):
+                    return
+                session.reply_id = reply_id
+                replies = self._dispatch(session, command, packet[8:])
+                if not replies:
+                    continue
+                if self.latency:
+                    time.sleep(self.latency)
+                if self._lossy():
+                    time.sleep(TCP_RETRANSMIT_DELAY)
+                for cmd, payload in replies:
+                    if cmd == "chunk":
+                        send(make_packet(const.CMD_DATA, session.session_id, reply_id, payload))
+                    else:
+                        send(make_packet(cmd, session.session_id, reply_id, payload))
+                if command == const.CMD_REG_EVENT:
+                    self._track_live(session, send)
+                if command == const.CMD_EXIT:
+                    return
+        except OSError:
+            return
+        finally:
+            self._untrack_live(session)
+
+    # ------------------------------------------------------------------ UDP
+    def _handle_udp(self, packet, sock, client):
+        if len(packet) < 8:
+            return
+        command, _, _, reply_id = unpack("<4H", packet[:8])
+        with self.lock:
+            session = self.udp_sessions.get(client)
+            if session is None or command == const.CMD_CONNECT:
+                session = self.udp_sessions[client] = _Session(self.random.randint(1, 0xFFFE))
+        if self._should_drop(session):
+            return
+        replies = self._dispatch(session, command, packet[8:])
+        if not replies:
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        if self._lossy():
+            return
+
+        def send(p):
+            sock.sendto(p, client)
+
+        for cmd, payload in replies:
+            if cmd == "chunk":
+                send(make_packet(const.CMD_PREPARE_DATA, session.session_id, reply_id, pack("<I", len(payload))))
+                for i in range(0, len(payload), UDP_DATA_CHUNK):
+                    send(make_packet(const.CMD_DATA, session.session_id, reply_id, payload[i:i + UDP_DATA_CHUNK]))
+                    time.sleep(0)   # let the client drain its socket buffer
+                send(make_packet(const.CMD_ACK_OK, session.session_id, reply_id))
+            else:
+                send(make_packet(cmd, session.session_id, reply_id, payload))
+        if command == const.CMD_REG_EVENT:
+            self._track_live(session, send)
+        if command == const.CMD_EXIT:
+            with self.lock:
+                self.udp_sessions.pop(client, None)
+            self._untrack_live(session)
+
+    # ----------------------------------------------------------------- live
+    def _track_live(self, session, send):
+        with self.lock:
+            self.live_clients = [(s, sess) for s, sess in self.live_clients if sess is not session]
+            if session.live:
+                self.live_clients.append((send, session))
+
+    def _untrack_live(self, session):
+        with self.lock:
+            self.live_clients = [(s, sess) for s, sess in self.live_clients if sess is not session]
@@ -244,12 +244,19 @@
 #     except Exception as e:
 #         log_error(e, "mark_absent_for_date")
 
+import hashlib
+
 import frappe
 from datetime import datetime, timedelta
 from frappe.utils import get_datetime, now_datetime
 
+from . import dirty_attendance, draft_backlog
+from .attendance_rules import attendance_changed, in_shard
 # helpers expected to exist in your repo (you referenced them before)
-from .helpers import get_leave_status, is_holiday, calculate_working_hours, determine_attendance_status
+from .helpers import (
+    chunked, get_leave_status, is_holiday, calculate_working_hours, determine_attendance_status,
+    get_sync_settings, load_leave_index,
+)
 
 # ------------------
 # ASSUMPTIONS / TODO
@@ -416,11 +423,17 @@ def auto_submit_due_attendances():
 # ------------------------
 # Realtime processing (when checkins exist)
 # ------------------------
-def process_attendance_realtime(from_date=None, to_date=None):
+def process_attendance_realtime(from_date=None, to_date=None, reprocess_drafts=True, stats=None, shard=None,
+                                employees=None):
     """
     Recreates the attendance records from Employee Checkin table per employee per date.
     Supports date ranges and ensures all active employees have records.
-    Also dynamically re-processes all existing DRAFT attendance records.
+    Also dynamically re-processes all existing DRAFT attendance records
+    (skip with reprocess_drafts=False, e.g. when walking history in chunks).
+    Returns the Attendance names written; ``stats``, when given, receives
+    the written / unchanged counts. ``shard`` ((index, count), see in_shard)
+    limits the run to one shard of the employees (attendance_shards);
+    ``employees`` to the given employee ids (backfill).
     """
     from frappe.utils import getdate, add_days
     
@@ -436,36 +449,160 @@ def process_attendance_realtime(from_date=None, to_date=None):
     created_or_updated = []
 
     # 1. Process for the specific date range (Active Employees)
+    only = set(employees) if employees is not None else None
     employees = frappe.get_all("Employee", filters={"status": "Active"}, fields=["name", "default_shift"])
+    if shard:
+        employees = [emp for emp in employees if in_shard(emp.name, shard)]
+    if only is not None:
+        employees = [emp for emp in employees if emp.name in only]
+    limited = bool(shard) or only is not None
+    window = load_window(from_date, to_date, [emp.name for emp in employees] if limited else None)
     for emp in employees:
         try:
-            process_employee_attendance_realtime(emp.name, emp.default_shift or "", created_or_updated, from_date, to_date)
+            process_employee_attendance_realtime(
+                emp.name, emp.default_shift or "", created_or_updated, from_date, to_date, window, stats
+            )
         except Exception as e:
             frappe.log_error(f"{emp.name} attendance error: {e}", "Realtime Attendance Error")
 
-    # 2. Dynamically re-process all existing DRAFT attendance records (even if older)
-    draft_attendances = frappe.get_all("Attendance", filters={"docstatus": 0}, fields=["employee", "attendance_date", "shift"])
-    for att in draft_attendances:
+    # 2. Re-process older DRAFT attendance records whose inputs changed
+    if reprocess_drafts:
+        reprocess_draft_backlog(from_date, to_date, created_or_updated, stats, shard)
+
+    frappe.db.commit()
+    return created_or_updated
+
+
+def reprocess_draft_backlog(from_date, to_date, created_list=None, stats=None, shard=None):
+    """
+    Recompute draft Attendance outside from_date..to_date, bounded per run:
+    drafts older than "Draft Reprocess Max Age" are left alone, drafts whose
+    input fingerprint matches the one they were settled with (draft_backlog)
+    are skipped, and at most "Draft Reprocess Batch Size" are recomputed
+    (per shard when ``shard`` is given). Returns the drafts recomputed.
+    """
+    from frappe.utils import getdate, add_days
+
+    settings = get_sync_settings()
+    filters = {"docstatus": 0}
+    if settings.draft_reprocess_max_age_days:
+        filters["attendance_date"] = [">=", add_days(getdate(), -settings.draft_reprocess_max_age_days)]
+    drafts = [
+        att for att in frappe.get_all(
+            "Attendance", filters=filters, fields=["name", "employee", "attendance_date", "shift", "modified"]
+        )
+        if not from_date <= getdate(att.attendance_date) <= to_date
+        and (not shard or in_shard(att.employee, shard))
+    ]
+
+    index = draft_backlog.load_index()
+    # a shard only sees, and so only prunes, its own drafts
+    draft_backlog.prune({att.name for att in drafts}, {
+        name: entry for name, entry in index.items()
+        if not shard or (entry.get("employee") and in_shard(entry["employee"], shard))
+    })
+
+    window = load_draft_window(drafts)
+    fingerprints = {att.name: get_draft_fingerprint(att, window) for att in drafts}
+    due = draft_backlog.select_due(drafts, fingerprints, index, settings.draft_reprocess_batch_size)
+
+    for att in due:
+        draft_stats = {}
         try:
-            # Skip if already processed in step 1 (to avoid redundant DB hits)
-            if from_date <= getdate(att.attendance_date) <= to_date:
-                continue
-                
             process_employee_attendance_realtime(
-                att.employee, 
-                att.shift or "", 
-                created_or_updated, 
-                att.attendance_date, 
-                att.attendance_date
+                att.employee,
+                att.shift or "",
+                created_list,
+                att.attendance_date,
+                att.attendance_date,
+                window,
+                draft_stats
             )
         except Exception as e:
             frappe.log_error(f"Draft re-process error: {att.employee} on {att.attendance_date}: {e}", "Draft Re-process Error")
+            continue
+
+        if stats is not None:
+            for key, value in draft_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        # a write changes the draft (and so its fingerprint); it settles on
+        # the next run that finds nothing to write
+        if not draft_stats.get("written"):
+            draft_backlog.settle(att.name, att.employee, fingerprints[att.name])
+
+    return due
+
+
+def get_draft_fingerprint(att, window):
+    """Digest of what a draft's recompute depends on, from its load_draft_window() window."""
+    from frappe.utils import getdate
+
+    date = getdate(att.attendance_date)
+    punches = window.punches.get((att.employee, date)) or {}
+    inputs = (
+        [str(punches.get(k)) for k in ("first_in", "last_out", "earliest", "latest")],
+        get_leave_status(att.employee, date, window.leaves),
+        bool(is_holiday(att.employee, date)),
+        att.shift or "",
+        str(att.modified),
+    )
+    return hashlib.sha1(repr(inputs).encode()).hexdigest()
+
+
+def process_dirty_attendance(stats=None):
+    """
+    Incremental recompute: only the (employee, date) pairs marked in
+    dirty_attendance since the last run, one grouped punch query per date.
+    Used by the frequent sync runs; process_attendance_realtime remains the
+    full sweep (nightly, backfill, manual "Mark Attendance"). Returns and
+    ``stats`` as there.
+    """
+    created_or_updated = []
+    with dirty_attendance.claim() as pairs:
+        if not pairs:
+            return []
+
+        by_date = {}
+        for employee, date in pairs:
+            by_date.setdefault(date, set()).add(employee)
+
+        shifts = {
+            e.name: e.default_shift or ""
+            for e in frappe.get_all(
+                "Employee",
+                filters={"status": "Active", "name": ["in", list({e for e, _ in pairs})]},
+                fields=["name", "default_shift"]
+            )
+        }
+        for date, employees in sorted(by_date.items()):
+            employees = sorted(e for e in employees if e in shifts)
+            window = load_window(date, date, employees)
+            for employee in employees:
+                try:
+                    process_employee_attendance_realtime(
+                        employee, shifts[employee], created_or_updated, date, date, window, stats
+                    )
+                except Exception as e:
+                    frappe.log_error(f"{employee} attendance error on {date}: {e}", "Realtime Attendance Error")
+
+        frappe.db.commit()
 
-    frappe.db.commit()
     return created_or_updated
 
 
-def process_employee_attendance_realtime(employee, shift, created_list=None, from_date=None, to_date=None):
+def process_employee_attendance_realtime(employee, shift, created_list=None, from_date=None, to_date=None, window=None, stats=None):
+    """
+    Create or update the employee's Attendance for each day of the range.
+    ``window`` is the load_window() result covering this employee and range;
+    it is loaded here when not passed.
+
+    An existing record is only written when a computed value differs from the
+    stored one, so unchanged days cost no save, version row or hook.
+    ``stats`` ({"written", "unchanged"}) is incremented per day.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("written", 0)
+    stats.setdefault("unchanged", 0)
     from frappe.utils import getdate, add_days
     
     if not from_date or not to_date:
@@ -476,87 +613,38 @@ def process_employee_attendance_realtime(employee, shift, created_list=None, fro
     from_date = getdate(from_date)
     to_date = getdate(to_date)
 
-    # Fetch all checkins for the range at once
-    checkins = frappe.get_all(
-        "Employee Checkin",
-        filters={
-            "employee": employee,
-            "time": ["between", [f"{from_date} 00:00:00", f"{to_date} 23:59:59"]]
-        },
-        fields=["name", "time", "log_type"],
-        order_by="time asc", 
-        limit_page_length=50000
-    )
-
-    by_date = {}
-    for c in checkins:
-        d = get_datetime(c.get('time')).date()
-        by_date.setdefault(d, []).append(c)
+    if window is None:
+        window = load_window(from_date, to_date, [employee])
 
     # Iterate through every single day in the range
     curr_date = from_date
     while curr_date <= to_date:
-        daily = by_date.get(curr_date, [])
-        
+        first_time, last_time = get_in_out_times(window.punches.get((employee, curr_date)))
+
         hours = 0.0
-        first_time = None
-        last_time = None
-        
-        if daily:
-            # Find FIRST IN punch and LAST OUT punch (matching get_checkin_times_dynamic logic)
-            in_punches = []
-            out_punches = []
-            all_punches = []
-            
-            for checkin in daily:
-                log_type = (checkin.get('log_type') or '').strip().upper()
-                checkin_time = checkin.get('time')
-                
-                # Ensure we have a datetime object for comparison
-                if checkin_time:
-                    checkin_dt = get_datetime(checkin_time)
-                    all_punches.append(checkin_dt)
-                    
-                    if log_type == "IN":
-                        in_punches.append(checkin_dt)
-                    elif log_type == "OUT":
-                        out_punches.append(checkin_dt)
-            
-            # Use FIRST IN punch if available, otherwise use earliest punch
-            if in_punches:
-                first_time = min(in_punches)  # First IN punch
-            elif all_punches:
-                first_time = min(all_punches)  # Fallback to earliest
-            
-            # Use LAST OUT punch if available, otherwise use latest punch
-            if out_punches:
-                last_time = max(out_punches)  # Last OUT punch
-            elif all_punches:
-                last_time = max(all_punches)  # Fallback to latest
-            
-            if first_time and last_time:
-                hours = calculate_working_hours(first_time, last_time)
+        if first_time and last_time:
+            hours = calculate_working_hours(first_time, last_time)
 
-        leave_status = get_leave_status(employee, curr_date)
+        leave_status = get_leave_status(employee, curr_date, window.leaves)
         holiday_flag = is_holiday(employee, curr_date)
         
         # determine_attendance_status handles 0 hours as Absent unless holiday/leave
         status = determine_attendance_status(hours, leave_status, holiday_flag)
 
-        # Check for existing attendance (both draft and submitted)
-        existing_draft = frappe.db.exists("Attendance", {
-            "employee": employee, 
-            "attendance_date": curr_date,
-            "docstatus": 0
-        })
-        
-        existing_submitted = frappe.db.exists("Attendance", {
-            "employee": employee, 
-            "attendance_date": curr_date,
-            "docstatus": 1
-        })
+        # Existing attendance (both draft and submitted), from the window
+        existing = window.attendance.get((employee, curr_date), {})
+        existing_draft = existing[0].name if 0 in existing else None
+        existing_submitted = existing[1].name if 1 in existing else None
+
+        leave_fields = {"leave_type": None, "leave_application": None}
+        if leave_status and leave_status[0]:
+            leave_fields = {"leave_type": leave_status[1], "leave_application": leave_status[2]}
 
-        if existing_draft:
+        if existing_draft and not attendance_changed(existing[0], dict(
+            in_time=first_time, out_time=last_time, working_hours=hours, status=status, shift=shift, **leave_fields
+        )):
+            stats["unchanged"] += 1
+        elif existing_draft:
             # Update draft attendance
             doc = frappe.get_doc("Attendance", existing_draft)
             doc.in_time = first_time
@@ -573,12 +661,7 @@ def process_employee_attendance_realtime(employee, shift, created_list=None, fro
             doc.shift = shift
             
             # Link leave if applicable
-            if leave_status and leave_status[0]:
-                doc.leave_type = leave_status[1]
-                doc.leave_application = leave_status[2]
-            else:
-                doc.leave_type = None
-                doc.leave_application = None
+            doc.update(leave_fields)
 
             doc.flags.ignore_permissions = True
             doc.save()
@@ -586,6 +669,7 @@ def process_employee_attendance_realtime(employee, shift, created_list=None, fro
             if actual_status == "Holiday":
                 doc.db_set("status", "Holiday")
             
+            stats["written"] += 1
             if created_list is not None:
                 created_list.append(existing_draft)
         elif existing_submitted:
@@ -599,11 +683,13 @@ def process_employee_attendance_realtime(employee, shift, created_list=None, fro
             if hours is not None:
                 update_fields["working_hours"] = hours
             
-            if update_fields:
+            if not attendance_changed(existing[1], update_fields):
+                stats["unchanged"] += 1
+            else:
                 frappe.db.set_value("Attendance", existing_submitted, update_fields, update_modified=False)
-            
-            if created_list is not None:
-                created_list.append(existing_submitted)
+                stats["written"] += 1
+                if created_list is not None:
+                    created_list.append(existing_submitted)
         else:
             # Create new attendance record
             if not existing_submitted:
@@ -630,6 +716,7 @@ def process_employee_attendance_realtime(employee, shift, created_list=None, fro
                 if actual_status == "Holiday":
                     doc.db_set("status", "Holiday")
 
+                stats["written"] += 1
                 if created_list is not None:
                     created_list.append(doc.name)
         
@@ -638,6 +725,140 @@ def process_employee_attendance_realtime(employee, shift, created_list=None, fro
     # no commit here: caller should commit once for batch operations
 
 
+# ------------------------
+# Processing window (set-based loads)
+# ------------------------
+def load_window(from_date, to_date, employees=None):
+    """
+    Inputs of the attendance computation for a date range, loaded up front
+    so the per-day loop does not query: ``punches`` (get_daily_punches),
+    ``leaves`` (helpers.load_leave_index) and ``attendance``
+    (get_attendance_map). ``employees`` limits all three; None covers every
+    employee.
+    """
+    return frappe._dict({
+        "punches": get_daily_punches(from_date, to_date, employees),
+        "leaves": load_leave_index(from_date, to_date, employees),
+        "attendance": get_attendance_map(from_date, to_date, employees),
+    })
+
+
+def load_draft_window(draft_attendances):
+    """load_window() for scattered draft (employee, attendance_date) pairs."""
+    from frappe.utils import getdate
+
+    if not draft_attendances:
+        return frappe._dict({"punches": {}, "leaves": {}, "attendance": {}})
+
+    dates = [getdate(att.attendance_date) for att in draft_attendances]
+    employees = {att.employee for att in draft_attendances}
+    return frappe._dict({
+        "punches": get_draft_punches(draft_attendances),
+        "leaves": load_leave_index(min(dates), max(dates), employees),
+        "attendance": get_attendance_map(min(dates), max(dates), employees),
+    })
+
+
+def get_daily_punches(from_date, to_date, employees=None):
+    """
+    First IN, last OUT, earliest and latest checkin time per (employee, day)
+    between from_date and to_date, computed by grouped queries rather than
+    per employee. ``employees`` limits the scan (in chunks of
+    EMPLOYEE_IN_CHUNK); None covers every employee.
+
+    Returns {(employee, date): {"first_in", "last_out", "earliest", "latest"}}.
+    """
+    from frappe.utils import getdate
+
+    if employees is not None and not employees:
+        return {}
+
+    daily = {}
+    for chunk in chunked(employees):
+        rows = frappe.db.sql(
+            f"""
+            SELECT employee, DATE(time) AS day,
+                MIN(CASE WHEN UPPER(TRIM(log_type)) = 'IN' THEN time END) AS first_in,
+                MAX(CASE WHEN UPPER(TRIM(log_type)) = 'OUT' THEN time END) AS last_out,
+                MIN(time) AS earliest,
+                MAX(time) AS latest
+            FROM `tabEmployee Checkin`
+            WHERE time BETWEEN %(from_time)s AND %(to_time)s
+                {"AND employee IN %(employees)s" if chunk else ""}
+            GROUP BY employee, DATE(time)
+            """,
+            {
+                "from_time": f"{getdate(from_date)} 00:00:00",
+                "to_time": f"{getdate(to_date)} 23:59:59",
+                "employees": chunk,
+            },
+            as_dict=True
+        )
+        for r in rows:
+            daily[(r.employee, getdate(r.day))] = r
+    return daily
+
+
+def get_attendance_map(from_date, to_date, employees=None):
+    """
+    Draft and submitted Attendance in the window, one query (per chunk of
+    EMPLOYEE_IN_CHUNK employees), as {(employee, date): {docstatus: row}}.
+    """
+    from frappe.utils import getdate
+
+    if employees is not None and not employees:
+        return {}
+
+    attendance = {}
+    for chunk in chunked(None if employees is None else sorted(employees)):
+        filters = {
+            "attendance_date": ["between", [getdate(from_date), getdate(to_date)]],
+            "docstatus": ["<", 2],
+        }
+        if chunk:
+            filters["employee"] = ["in", chunk]
+        for row in frappe.get_all(
+            "Attendance",
+            filters=filters,
+            fields=[
+                "name", "employee", "attendance_date", "docstatus", "status", "in_time", "out_time",
+                "working_hours", "shift", "leave_type", "leave_application",
+            ]
+        ):
+            attendance.setdefault((row.employee, getdate(row.attendance_date)), {}).setdefault(row.docstatus, row)
+    return attendance
+
+
+def get_draft_punches(draft_attendances):
+    """get_daily_punches() for scattered draft (employee, attendance_date) pairs, one query per date."""
+    from frappe.utils import getdate
+
+    by_date = {}
+    for att in draft_attendances:
+        by_date.setdefault(getdate(att.attendance_date), set()).add(att.employee)
+
+    daily = {}
+    for day, employees in by_date.items():
+        daily.update(get_daily_punches(day, day, sorted(employees)))
+    return daily
+
+
+def get_in_out_times(punches):
+    """
+    (in_time, out_time) of a day from its get_daily_punches() row: the first
+    IN punch, else the earliest punch, and the last OUT punch, else the
+    latest punch (matching get_checkin_times_dynamic).
+    """
+    if not punches:
+        return None, None
+    first_time = punches.first_in or punches.earliest
+    last_time = punches.last_out or punches.latest
+    return (
+        get_datetime(first_time) if first_time else None,
+        get_datetime(last_time) if last_time else None,
+    )
+
+
 def auto_submit_new_attendances(attendance_names):
     """
     Called after new Attendance docs are created. This checks each new attendance doc
@@ -0,0 +1,89 @@
+# at_biometric_integration/utils/attendance_rules.py
+"""Leave lookup, change detection and employee sharding rules of the attendance computation."""
+import zlib
+from bisect import bisect_right
+from datetime import datetime, time
+
+
+# ------------------------------------------------
+# Leave index
+# ------------------------------------------------
+class LeaveEntry:
+    """
+    One employee's leaves sorted by from_date. max_ends[i] is the latest
+    to_date among leaves[:i + 1], which bounds the backward scan in
+    find_leave.
+    """
+    __slots__ = ("starts", "max_ends", "leaves")
+
+    def __init__(self):
+        self.starts = []
+        self.max_ends = []
+        self.leaves = []
+
+
+def build_leave_index(leaves):
+    """{employee: LeaveEntry} of leave rows whose from_date / to_date are dates."""
+    index = {}
+    for leave in sorted(leaves, key=lambda l: l.from_date):
+        entry = index.setdefault(leave.employee, LeaveEntry())
+        entry.starts.append(leave.from_date)
+        entry.max_ends.append(max(leave.to_date, entry.max_ends[-1]) if entry.max_ends else leave.to_date)
+        entry.leaves.append(leave)
+    return index
+
+
+def find_leave(entry, date):
+    """The leave of a leave index entry covering ``date``; the latest modified when several do."""
+    found = None
+    i = bisect_right(entry.starts, date) - 1
+    while i >= 0 and entry.max_ends[i] >= date:
+        leave = entry.leaves[i]
+        if leave.to_date >= date and (found is None or leave.modified > found.modified):
+            found = leave
+        i -= 1
+    return found
+
+
+# ------------------------------------------------
+# Change detection
+# ------------------------------------------------
+def _as_datetime(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime.combine(value, time())
+
+
+def _hours(value):
+    try:
+        return round(float(value or 0), 3)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def attendance_changed(row, values):
+    """Whether any of ``values`` differs from the stored Attendance ``row``."""
+    for field, value in values.items():
+        stored = row.get(field)
+        if field == "working_hours":
+            if _hours(stored) != _hours(value):
+                return True
+        elif field in ("in_time", "out_time"):
+            if _as_datetime(stored) != _as_datetime(value):
+                return True
+        elif (stored or None) != (value or None):
+            return True
+    return False
+
+
+# ------------------------------------------------
+# Sharding
+# ------------------------------------------------
+def in_shard(employee, shard):
+    """Whether ``employee`` belongs to shard (index, count); stable across runs and workers."""
+    index, count = shard
+    return zlib.crc32(employee.encode()) % count == index
@@ -0,0 +1,144 @@
+# at_biometric_integration/utils/attendance_shards.py
+"""
+Sharded full recompute: the active employees are split into N shards
+(attendance_rules.in_shard, a stable hash of the employee id) and each
+shard runs process_attendance_realtime as its own job on the long queue, so
+N workers share a large range.
+
+    recompute_attendance    entry point; inline when shards <= 1
+    run_shard               one shard: takes the shard lock, recomputes,
+                            commits, reports into the run hash
+    get_run_summary         the merged summary once every shard reported
+
+The shard lock (a Redis lock per shard count and index) keeps two runs
+from recomputing the same shard at once; a shard that finds it held reports
+"locked" and does nothing. The count is part of the key because shard 1 of
+4 and shard 1 of 8 are different employees: with the index alone, a run
+started after the shard setting changed would skip employees nobody else
+is recomputing. Every shard stores its result in the run hash
+and then increments the run's REPORTED_KEY counter; the one shard whose
+increment reaches the shard count (Redis INCR is atomic, so exactly one)
+merges the run summary, stores it under SUMMARY_KEY and publishes it as a
+realtime event.
+"""
+import frappe
+from frappe.utils import add_days, getdate, now
+
+from . import attendance_processing
+from .helpers import get_sync_settings
+
+SHARD_TIMEOUT = 4 * 60 * 60
+RUN_KEY = "biometric_attendance_run"
+REPORTED_KEY = "biometric_attendance_run_reported"
+SUMMARY_KEY = "biometric_attendance_run_summary"
+LOCK_KEY = "biometric_attendance_shard_lock"
+RUN_TTL = 24 * 60 * 60
+RUN_DONE_EVENT = "biometric_attendance_run_done"
+
+
+def recompute_attendance(from_date=None, to_date=None, reprocess_drafts=True, shards=None):
+    """
+    Full recompute of from_date..to_date (process_attendance_realtime's
+    defaults when not given), split into ``shards`` jobs ("Attendance
+    Recompute Shards" in Attendance Settings when not given).
+
+    Returns the run summary when run inline, else {"run_id", "shards"} for
+    get_run_summary.
+    """
+    to_date = getdate(to_date)
+    from_date = getdate(from_date) if from_date else add_days(to_date, -1)
+
+    shards = shards or get_sync_settings().attendance_recompute_shards
+    if shards <= 1:
+        stats = {}
+        processed = attendance_processing.process_attendance_realtime(
+            from_date, to_date, reprocess_drafts, stats=stats
+        )
+        return dict(stats, processed=len(processed), shards=1)
+
+    run_id = frappe.generate_hash(length=10)
+    for index in range(shards):
+        frappe.enqueue(
+            "at_biometric_integration.utils.attendance_shards.run_shard",
+            queue="long",
+            timeout=SHARD_TIMEOUT,
+            job_id=f"biometric_attendance_shard::{run_id}::{index}",
+            run_id=run_id,
+            index=index,
+            count=shards,
+            from_date=str(from_date),
+            to_date=str(to_date),
+            reprocess_drafts=reprocess_drafts,
+        )
+    return {"run_id": run_id, "shards": shards}
+
+
+def run_shard(run_id, index, count, from_date, to_date, reprocess_drafts=True):
+    """Background job: recompute one shard and report into the run."""
+    cache = frappe.cache()
+    lock = cache.lock(cache.make_key(f"{LOCK_KEY}:{count}:{index}"), timeout=SHARD_TIMEOUT)
+    result = {"shard": index, "status": "locked", "written": 0, "unchanged": 0, "processed": 0}
+
+    if lock.acquire(blocking=False):
+        started = now()
+        try:
+            stats = {}
+            processed = attendance_processing.process_attendance_realtime(
+                from_date, to_date, reprocess_drafts, stats=stats, shard=(index, count)
+            )
+            result.update(stats, status="ok", processed=len(processed))
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), "Attendance Shard")
+            result.update(status="error", error=str(e))
+        finally:
+            lock.release()
+        result.update(started=started, finished=now())
+    else:
+        frappe.logger().info(f"[Attendance Shards] shard {index} is held by another run; skipped in {run_id}")
+
+    report_shard(run_id, count, result)
+    return result
+
+
+def report_shard(run_id, count, result):
+    cache = frappe.cache()
+    key = f"{RUN_KEY}:{run_id}"
+    cache.hset(key, str(result["shard"]), result)
+    cache.expire(cache.make_key(key), RUN_TTL)
+
+    # the result is stored before the increment, so whoever reaches count
+    # sees every shard's result
+    counter = cache.make_key(f"{REPORTED_KEY}:{run_id}")
+    reported = cache.incr(counter)
+    cache.expire(counter, RUN_TTL)
+    if reported != count:
+        return
+
+    results = cache.hgetall(key) or {}
+    summary = merge_shard_results(run_id, list(results.values()))
+    cache.set_value(f"{SUMMARY_KEY}:{run_id}", summary, expires_in_sec=RUN_TTL)
+    frappe.logger().info(
+        f"[Attendance Shards] run {run_id}: {summary['written']} written, {summary['unchanged']} unchanged, "
+        f"{len(summary['locked'])} locked, {len(summary['errors'])} failed"
+    )
+    frappe.publish_realtime(RUN_DONE_EVENT, summary)
+
+
+def merge_shard_results(run_id, results):
+    results = sorted(results, key=lambda r: r["shard"])
+    return {
+        "run_id": run_id,
+        "shards": len(results),
+        "written": sum(r.get("written", 0) for r in results),
+        "unchanged": sum(r.get("unchanged", 0) for r in results),
+        "processed": sum(r.get("processed", 0) for r in results),
+        "locked": [r["shard"] for r in results if r["status"] == "locked"],
+        "errors": [f"shard {r['shard']}: {r.get('error')}" for r in results if r["status"] == "error"],
+        "results": results,
+    }
+
+
+def get_run_summary(run_id):
+    """Merged summary of a sharded run, or None while shards are still running."""
+    return frappe.cache().get_value(f"{SUMMARY_KEY}:{run_id}")
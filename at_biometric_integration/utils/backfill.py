@@ -0,0 +1,152 @@
+# at_biometric_integration/utils/backfill.py
+"""
+Resumable historical backfill for one device.
+
+Stages, recorded in a checkpoint file per device:
+
+    download  pull the device log, keep the Sync From / Sync To window and
+              write one durable partition per punch date
+    process   walk the partitions in chunks of BACKFILL_CHUNK_DAYS: create
+              checkins, recompute attendance for the chunk, commit, then
+              advance the checkpoint. Each chunk recomputes the days from
+              the end of the previous one (the Sync From date for the
+              first, the Sync To date for the last), so days without
+              punches are covered too, and only for the employees with
+              punches in the chunk
+    done      partitions removed, checkpoint kept as the run summary
+
+A worker that dies mid-run loses at most the chunk in flight; the chunk is
+redone on resume, which is idempotent because checkin creation dedupes and
+attendance is recomputed. The hourly resume_pending_backfills re-enqueues
+unfinished runs.
+"""
+import os
+import shutil
+
+import frappe
+from frappe.utils import add_days, getdate, now
+
+from . import attendance_processing, biometric_sync, checkin_processing
+from .employee_cache import get_active_employee, get_employee_map
+from .helpers import log_error
+
+BACKFILL_CHUNK_DAYS = 7
+BACKFILL_TIMEOUT = 4 * 60 * 60
+
+
+def get_checkpoint_path(ip):
+    return os.path.join(biometric_sync.BACKFILL_DIR, f"{ip}.json")
+
+
+def load_checkpoint(ip):
+    path = get_checkpoint_path(ip)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return frappe._dict(frappe.parse_json(f.read()))
+    except Exception as e:
+        log_error(e, "load backfill checkpoint")
+        return None
+
+
+def save_checkpoint(cp):
+    os.makedirs(biometric_sync.BACKFILL_DIR, exist_ok=True)
+    biometric_sync.write_json_file(get_checkpoint_path(cp["ip"]), cp, durable=True)
+
+
+def enqueue_backfill(device_name):
+    frappe.enqueue(
+        "at_biometric_integration.utils.backfill.run_backfill",
+        queue="long",
+        timeout=BACKFILL_TIMEOUT,
+        job_id=f"biometric_backfill::{device_name}",
+        deduplicate=True,
+        device_name=device_name,
+    )
+
+
+def run_backfill(device_name):
+    dev = frappe.get_doc("Biometric Device Settings", device_name)
+    ip = dev.device_ip
+    window = {
+        "from_date": str(dev.sync_from_date) if dev.sync_from_date else None,
+        "to_date": str(dev.sync_to_date) if dev.sync_to_date else None,
+    }
+
+    cp = load_checkpoint(ip)
+    if not cp or cp.get("stage") == "done" or cp.get("window") != window:
+        shutil.rmtree(biometric_sync.get_backfill_dir(ip), ignore_errors=True)
+        cp = frappe._dict({
+            "device": device_name, "ip": ip, "window": window, "stage": "download", "started": now(),
+            "partitions": [], "next_index": 0, "records": 0, "created_checkins": 0, "attendance": 0,
+        })
+        save_checkpoint(cp)
+
+    if cp.stage == "download":
+        partitions = biometric_sync.sync_all_historical_data(
+            ip, dev.device_port or 4370, window["from_date"], window["to_date"]
+        )
+        cp.update(stage="process", partitions=list(partitions), records=sum(partitions.values()))
+        save_checkpoint(cp)
+
+    while cp.next_index < len(cp.partitions):
+        chunk = cp.partitions[cp.next_index:cp.next_index + BACKFILL_CHUNK_DAYS]
+        from_date, to_date = get_chunk_range(cp, chunk)
+        emp_map = get_employee_map()
+        employees = set()
+        created = 0
+        for day in chunk:
+            records = biometric_sync.load_backfill_partition(ip, day)
+            employees.update(
+                emp.name for emp in (get_active_employee(r.get("user_id"), emp_map) for r in records) if emp
+            )
+            # the chunk's attendance is recomputed right below, so nothing is marked dirty
+            created += len(checkin_processing.create_checkins_from_records(
+                ip, records, commit=False, mark_dirty=False
+            ))
+        processed = []
+        if employees:
+            processed = attendance_processing.process_attendance_realtime(
+                from_date, to_date, reprocess_drafts=False, employees=employees
+            )
+        frappe.db.commit()
+
+        cp.next_index += len(chunk)
+        cp.created_checkins += created
+        cp.attendance += len(processed)
+        save_checkpoint(cp)
+
+    cp.update(stage="done", finished=now())
+    save_checkpoint(cp)
+    shutil.rmtree(biometric_sync.get_backfill_dir(ip), ignore_errors=True)
+    return cp
+
+
+def get_chunk_range(cp, chunk):
+    """
+    Dates to recompute for ``chunk``: from the day after the previous chunk's
+    last partition (the window start for the first chunk) to its own last
+    partition (the window end, capped at today, for the last chunk).
+    """
+    if cp.next_index:
+        from_date = add_days(cp.partitions[cp.next_index - 1], 1)
+    else:
+        from_date = cp.window.get("from_date") or chunk[0]
+
+    to_date = getdate(chunk[-1])
+    if cp.next_index + len(chunk) >= len(cp.partitions) and cp.window.get("to_date"):
+        to_date = max(to_date, min(getdate(cp.window["to_date"]), getdate()))
+    return getdate(from_date), to_date
+
+
+def resume_pending_backfills():
+    """Hourly: re-enqueue backfills that a worker restart left unfinished."""
+    if not os.path.isdir(biometric_sync.BACKFILL_DIR):
+        return
+    for filename in os.listdir(biometric_sync.BACKFILL_DIR):
+        if not filename.endswith(".json"):
+            continue
+        cp = load_checkpoint(filename[:-len(".json")])
+        if cp and cp.get("stage") != "done" and frappe.db.exists("Biometric Device Settings", cp.get("device")):
+            enqueue_backfill(cp.device)
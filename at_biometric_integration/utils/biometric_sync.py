@@ -2,12 +2,19 @@
 import frappe
 import os
 import json
-from frappe.utils import getdate, nowdate, get_datetime
-from zk import ZK
-from .helpers import log_error
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from frappe.utils import getdate, nowdate, get_datetime, now_datetime
+from .device_client import fetch_device_logs, fetch_new_device_logs, drain_device_logs, read_journal
+from .helpers import fsync_dir, log_error, get_sync_settings
+from . import device_health, punch_index
 
 ATTENDANCE_NAME = "attendance_logs"
 ATTENDANCE_DIR = frappe.get_site_path("public", "files", ATTENDANCE_NAME)
+DRAIN_DIR = os.path.join(ATTENDANCE_DIR, "drain")
+PARTITION_DIR = os.path.join(ATTENDANCE_DIR, "punches")
+COALESCE_DIR = os.path.join(ATTENDANCE_DIR, "coalesced")
+BACKFILL_DIR = os.path.join(ATTENDANCE_DIR, "backfill")
 
 PUNCH_MAPPING = {
     0: "Check-In",
@@ -18,81 +25,566 @@ PUNCH_MAPPING = {
     5: "Overtime End"
 }
 
-def ensure_dir():
-    if not os.path.exists(ATTENDANCE_DIR):
-        os.makedirs(ATTENDANCE_DIR, exist_ok=True)
+def write_json_file(path, data, durable=False):
+    """
+    Replace ``path`` atomically (write temp file, then rename). With ``durable``
+    the file and its directory are fsynced before returning.
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, default=str, indent=2)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if durable:
+        fsync_dir(os.path.dirname(path))
 
-def get_attendance_file_path(ip):
-    date_str = getdate(nowdate()).strftime("%Y-%m-%d")
-    return os.path.join(ATTENDANCE_DIR, f"attendance_{ip}_{date_str}.json")
+# ------------------------------------------------
+# Staging store (append-only JSONL, partitioned by punch date)
+# ------------------------------------------------
+# punches/<ip>/<YYYY-MM-DD>.jsonl holds the punches made on that date, one
+# record per line, appended as they arrive, so a write costs only the new
+# records. A crash can leave a torn last line: readers skip lines that do not
+# parse and the next append starts on a fresh line.
+#
+# punches/<ip>/manifest.json describes the partitions:
+#   {"YYYY-MM-DD": {"min_time", "max_time", "count", "updated_on"}}
+# It is rewritten under the punch index lock after every append and is what
+# downstream stages use to pick the partitions they need.
+def _jsonl(record):
+    return json.dumps(record, default=str, separators=(",", ":")) + "\n"
 
-def load_attendance_data(ip):
-    ensure_dir()
-    path = get_attendance_file_path(ip)
-    if os.path.exists(path):
-        try:
-            with open(path, "r") as f:
-                return json.load(f)
-        except Exception as e:
-            log_error(e, "load_attendance_data")
-            return []
-    return []
+def iter_attendance_records(path):
+    """Stream the records of a JSONL staging file without loading it whole."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                # torn write from a crash; the record is re-fetched via the cursor
+                continue
+            if isinstance(rec, dict):
+                yield rec
+
+def append_attendance_records(path, records, durable=False):
+    """
+    Append ``records`` to ``path`` in one buffered write. With ``durable`` the
+    file (and the directory, when the file is new) is fsynced before returning.
+    """
+    created = not os.path.exists(path)
+    with open(path, "ab+") as f:
+        lead = b""
+        if f.seek(0, os.SEEK_END):
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                lead = b"\n"
+        f.write(lead + "".join(_jsonl(r) for r in records).encode())
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    if durable and created:
+        fsync_dir(os.path.dirname(path))
+
+def get_partition_dir(ip):
+    return os.path.join(PARTITION_DIR, ip)
 
-def save_attendance_data(ip, records):
-    ensure_dir()
-    path = get_attendance_file_path(ip)
+def get_attendance_file_path(ip, date=None):
+    """Partition holding the punches of ``date`` (default today)."""
+    date_str = getdate(date or nowdate()).strftime("%Y-%m-%d")
+    return os.path.join(get_partition_dir(ip), f"{date_str}.jsonl")
+
+def get_manifest_path(ip):
+    return os.path.join(get_partition_dir(ip), "manifest.json")
+
+def load_manifest(ip):
+    path = get_manifest_path(ip)
+    if not os.path.exists(path):
+        return {}
     try:
-        with open(path, "w") as f:
-            json.dump(records, f, default=str, indent=2)
+        with open(path, "r") as f:
+            return json.load(f)
     except Exception as e:
-        log_error(e, "save_attendance_data")
+        log_error(e, "load_manifest")
+        return {}
+
+def update_manifest(ip, records, durable=False):
+    """Fold freshly appended ``records`` into the device manifest."""
+    manifest = load_manifest(ip)
+    updated_on = now_datetime().strftime("%Y-%m-%d %H:%M:%S")
+    for rec in records:
+        ts = rec["timestamp"]
+        entry = manifest.setdefault(ts[:10], {"min_time": ts, "max_time": ts, "count": 0})
+        entry["min_time"] = min(entry["min_time"], ts)
+        entry["max_time"] = max(entry["max_time"], ts)
+        entry["count"] += 1
+        entry["updated_on"] = updated_on
+    write_json_file(get_manifest_path(ip), manifest, durable=durable)
+
+def read_attendance_records(path, offset=0):
+    """
+    Records of a partition from byte ``offset`` on, and the offset just past
+    the last complete line read. A trailing line without its newline is left
+    for the next call (the append may still be in flight). An offset past
+    the end of the file belongs to an earlier file of that name (removed by
+    cleanup, then recreated), so the file is read from the start.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records, offset
+    if offset > os.path.getsize(path):
+        offset = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict):
+                records.append(rec)
+    return records, offset
+
+# Staging-to-checkin cursor: punches/<ip>/checkin_cursor.json maps each
+# partition date to the byte offset up to which its records have been turned
+# into checkins. Partitions only grow, so a partition as long as its offset
+# has nothing new; a shorter one was recreated after cleanup and is read
+# from the start.
+def get_checkin_cursor_path(ip):
+    return os.path.join(get_partition_dir(ip), "checkin_cursor.json")
 
-def fetch_attendance_from_device(ip, port=4370, timeout=10):
-    """Connect to device using zk library and return device logs"""
+def load_checkin_cursor(ip):
+    path = get_checkin_cursor_path(ip)
+    if not os.path.exists(path):
+        return {}
     try:
-        zk = ZK(ip, port=int(port), timeout=timeout, force_udp=False, ommit_ping=False)
-        conn = zk.connect()
-        if conn:
-            logs = conn.get_attendance()
-            conn.disconnect()
-            return logs
+        with open(path, "r") as f:
+            return json.load(f)
     except Exception as e:
-        log_error(f"fetch_attendance_from_device failed for {ip}:{port} - {e}", "Device Fetch")
-    return []
+        log_error(e, "load_checkin_cursor")
+        return {}
 
-def process_attendance_logs(ip, logs):
-    if not logs:
-        return []
+def save_checkin_cursor(ip, cursor):
+    write_json_file(get_checkin_cursor_path(ip), cursor)
+
+def get_pending_partitions(ip, cursor):
+    """{date: cursor offset} of the partitions of ``ip`` that grew past ``cursor``."""
+    pending = {}
+    for date in sorted(load_manifest(ip)):
+        path = get_attendance_file_path(ip, date)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        offset = int(cursor.get(date) or 0)
+        if size < offset:
+            offset = 0
+        if size > offset:
+            pending[date] = offset
+    return pending
 
-    existing = load_attendance_data(ip)
-    existing_keys = {
-        (str(r.get("user_id")), str(r.get("timestamp")))
-        for r in existing if isinstance(r, dict)
+def stage_records(ip, records, durable=False):
+    """
+    Append ``records`` to their punch-date partitions and update the manifest.
+    Callers hold the punch index lock (punch_index.claim). Raises on failure.
+    """
+    if not records:
+        return
+    ensure_partition_dir(ip)
+    by_date = {}
+    for rec in records:
+        by_date.setdefault(rec["timestamp"][:10], []).append(rec)
+    for date, recs in by_date.items():
+        append_attendance_records(get_attendance_file_path(ip, date), recs, durable=durable)
+    update_manifest(ip, records, durable=durable)
+
+def ensure_partition_dir(ip):
+    """Create the device partition directory, moving legacy day files in on first use."""
+    path = get_partition_dir(ip)
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+        repartition_legacy_files(ip)
+
+def iter_staged_files():
+    """(ip, path) of every staged JSONL file, partitions and legacy day files alike."""
+    if os.path.isdir(PARTITION_DIR):
+        for ip in sorted(os.listdir(PARTITION_DIR)):
+            for filename in sorted(os.listdir(get_partition_dir(ip))):
+                if filename.endswith(".jsonl"):
+                    yield ip, os.path.join(get_partition_dir(ip), filename)
+    for ip, path in iter_legacy_files():
+        if path.endswith(".jsonl"):
+            yield ip, path
+
+# Before partitioning, day files were attendance_<ip>_<fetch date>.json(l)
+# directly in ATTENDANCE_DIR; first a JSON list, then JSONL.
+def migrate_legacy_file(path):
+    """
+    One-time conversion of a pre-JSONL day file (a single JSON list at the
+    same path with a .json suffix) into ``path``. Returns the number of
+    records migrated, or None when there was nothing to migrate.
+    """
+    legacy = path[:-len(".jsonl")] + ".json"
+    if not os.path.exists(legacy):
+        return None
+    with open(legacy, "r") as f:
+        records = [r for r in json.load(f) if isinstance(r, dict)]
+    if os.path.exists(path):
+        # both exist: a migration was interrupted after the rename; the list is
+        # already in the JSONL file
+        os.remove(legacy)
+        return 0
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.writelines(_jsonl(r) for r in records)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(path))
+    os.remove(legacy)
+    return len(records)
+
+def migrate_legacy_files():
+    """Convert every legacy .json day file in the staging directory. Returns the file count."""
+    if not os.path.isdir(ATTENDANCE_DIR):
+        return 0
+    migrated = 0
+    for filename in sorted(os.listdir(ATTENDANCE_DIR)):
+        if filename.startswith("attendance_") and filename.endswith(".json"):
+            path = os.path.join(ATTENDANCE_DIR, filename + "l")
+            try:
+                if migrate_legacy_file(path) is not None:
+                    migrated += 1
+            except Exception as e:
+                log_error(f"migrate_legacy_file failed for {filename} - {e}", "Staging Migration")
+    return migrated
+
+def iter_legacy_files(ip=None):
+    """(ip, path) of the fetch-date day files left in ATTENDANCE_DIR."""
+    if not os.path.isdir(ATTENDANCE_DIR):
+        return
+    for filename in sorted(os.listdir(ATTENDANCE_DIR)):
+        if not (filename.startswith("attendance_") and filename.endswith((".json", ".jsonl"))):
+            continue
+        # attendance_<ip>_<YYYY-MM-DD>.json(l)
+        file_ip = filename[len("attendance_"):].rsplit("_", 1)[0]
+        if ip is None or file_ip == ip:
+            yield file_ip, os.path.join(ATTENDANCE_DIR, filename)
+
+def repartition_legacy_files(ip=None):
+    """
+    Move the records of fetch-date day files into punch-date partitions and
+    delete the old files. Returns the number of files moved.
+    """
+    moved = 0
+    for file_ip, path in list(iter_legacy_files(ip)):
+        try:
+            if path.endswith(".json"):
+                path += "l"
+                migrate_legacy_file(path)
+            records = list(iter_attendance_records(path))
+            os.makedirs(get_partition_dir(file_ip), exist_ok=True)
+            by_date = {}
+            for rec in records:
+                by_date.setdefault(str(rec.get("timestamp"))[:10], []).append(rec)
+            for date, recs in by_date.items():
+                append_attendance_records(get_attendance_file_path(file_ip, date), recs, durable=True)
+            if records:
+                update_manifest(file_ip, records, durable=True)
+            os.remove(path)
+            moved += 1
+        except Exception as e:
+            log_error(f"repartition_legacy_files failed for {path} - {e}", "Staging Migration")
+    return moved
+
+# ------------------------------------------------
+# Concurrent fetch stage
+# ------------------------------------------------
+CURSOR_FIELDS = ["sync_record_count", "sync_last_uid", "sync_last_timestamp"]
+# a changed device is downloaded whole: ~21s per 100k records on the simulator,
+# several times that on real devices over UDP
+FETCH_SECONDS_PER_1000_RECORDS = 1
+
+def get_device_cursors(device_names):
+    """
+    Sync cursors (record-count watermarks) keyed by Biometric Device Settings
+    name. A cursor also carries the device's clear_from_device_on_fetch flag.
+    """
+    names = [n for n in device_names if n]
+    if not names:
+        return {}
+    rows = frappe.get_all(
+        "Biometric Device Settings",
+        filters={"name": ["in", names]},
+        fields=["name", "clear_from_device_on_fetch"] + CURSOR_FIELDS
+    )
+    return {
+        r.name: {
+            "drain": bool(r.clear_from_device_on_fetch),
+            "record_count": r.sync_record_count or 0,
+            "last_uid": r.sync_last_uid,
+            "last_timestamp": r.sync_last_timestamp,
+        }
+        for r in rows
     }
 
-    new_records = []
+def save_device_cursor(device_name, cursor):
+    if not device_name or not cursor:
+        return
+    frappe.db.set_value("Biometric Device Settings", device_name, {
+        "sync_record_count": cursor["record_count"],
+        "sync_last_uid": cursor["last_uid"],
+        "sync_last_timestamp": cursor["last_timestamp"],
+    }, update_modified=False)
 
-    for log in logs:
-        ts = get_datetime(log.timestamp).strftime("%Y-%m-%d %H:%M:%S")
-        key = (str(log.user_id), ts)
+def _timed_fetch(idx, dev, cursor, started):
+    """Thread body: no frappe calls allowed here (see device_client)."""
+    started[idx] = time.monotonic()
+    if cursor and cursor.get("drain"):
+        return drain_device_logs(dev.device_ip, dev.device_port or 4370, journal_dir=DRAIN_DIR)
+    return fetch_new_device_logs(dev.device_ip, dev.device_port or 4370, cursor=cursor)
+
+def device_deadline(base, cursor, health):
+    """
+    Seconds one device's fetch may take: ``base`` plus
+    FETCH_SECONDS_PER_1000_RECORDS for every thousand records the device
+    held at its last fetch. None (bounded by the socket timeouts only) until
+    the device's first successful fetch, whose size is not known yet.
+    """
+    if not health or not health.get("health_last_success_on"):
+        return None
+    records = int((cursor or {}).get("record_count") or 0)
+    return base + records / 1000 * FETCH_SECONDS_PER_1000_RECORDS
+
+def fetch_summary(res):
+    """A fetch result without the raw logs, safe to return from an endpoint."""
+    return {k: res[k] for k in ("device", "status", "skipped", "device_records", "records", "elapsed", "error")}
+
+def stage_fetch_result(res):
+    """
+    Write a successful fetch result to the staging store, then advance the device
+    cursor. Staging raises on failure, before the cursor is saved, so the
+    records are downloaded again next run.
 
-        if key in existing_keys:
+    For a drained device the records are written durably and only then is the
+    drain journal removed; until that point the journal is the recovery copy.
+    """
+    journal = res.get("journal")
+    new_records = process_attendance_logs(res["device"], res["logs"], durable=bool(journal))
+    if journal:
+        os.remove(journal)
+    save_device_cursor(res.get("name"), res.get("cursor"))
+    return new_records
+
+def recover_drain_journals(ips):
+    """
+    Replay drain journals left behind by an interrupted run (worker died
+    between clearing the device and staging). Returns {ip: replayed count}.
+    """
+    if not os.path.isdir(DRAIN_DIR):
+        return {}
+    recovered = {}
+    for filename in sorted(os.listdir(DRAIN_DIR)):
+        if not filename.endswith(".jsonl"):
             continue
+        ip = next((ip for ip in ips if filename.startswith(f"drain_{ip}_")), None)
+        if not ip:
+            continue
+        path = os.path.join(DRAIN_DIR, filename)
+        try:
+            staged = process_attendance_logs(ip, read_journal(path), durable=True)
+            os.remove(path)
+            recovered[ip] = recovered.get(ip, 0) + len(staged)
+        except Exception as e:
+            log_error(f"recover_drain_journals failed for {filename} - {e}", "Device Drain")
+    return recovered
+
+def fetch_from_devices(devices, max_workers=None, deadline=None):
+    """
+    Fetch logs from all devices concurrently.
+
+    At most ``max_workers`` devices are contacted at once and each device gets
+    ``deadline`` seconds, scaled by its buffer size (see device_deadline), from
+    the moment its fetch starts. A device that overruns is reported as
+    "timeout" and abandoned; its thread ends on the socket timeout.
+
+    Each device is read incrementally against its sync cursor: when the
+    device record count has not moved the download is skipped, otherwise only
+    records past the cursor are returned in "logs". Devices with "Clear From
+    Device On Fetch" are drained instead (see device_client.drain_device_logs).
+    Pass the result to stage_fetch_result() to persist the records and the
+    new cursor.
+
+    Devices whose circuit is open (see device_health) are not contacted until
+    their next probe is due and come back as "circuit_open". Every other
+    outcome is recorded on the device's health fields.
+
+    Returns one result dict per device, in the same order as ``devices``:
+    {"device", "name", "status" (ok/error/timeout/circuit_open), "skipped",
+    "logs", "cursor", "device_records", "records", "elapsed", "error"}
+    Errors are logged here, in the calling thread.
+    """
+    if not devices:
+        return []
+
+    settings = get_sync_settings()
+    max_workers = max(1, min(int(max_workers or settings.device_fetch_concurrency), len(devices)))
+    deadline = float(deadline or settings.device_fetch_deadline)
+
+    names = [dev.get("name") for dev in devices]
+    cursors = get_device_cursors(names)
+    health = device_health.get_device_health(names)
+    if any(c.get("drain") for c in cursors.values()):
+        os.makedirs(DRAIN_DIR, exist_ok=True)
+        recover_drain_journals([dev.device_ip for dev in devices])
 
-        rec = {
-            "uid": getattr(log, "uid", None),
-            "user_id": str(log.user_id),
-            "timestamp": ts,
-            "punch": getattr(log, "punch", None),
-            "punch_type": PUNCH_MAPPING.get(log.punch, "Unknown"),
-            "device_ip": ip,
+    deadlines = {
+        idx: device_deadline(deadline, cursors.get(dev.get("name")), health.get(dev.get("name")))
+        for idx, dev in enumerate(devices)
+    }
+    started = {}
+    results = [
+        {"device": dev.device_ip, "name": dev.get("name"), "status": "timeout", "skipped": False, "logs": [],
+         "journal": None, "cursor": None, "device_records": None, "records": 0, "elapsed": None, "error": None}
+        for dev in devices
+    ]
+
+    due = []
+    for idx, dev in enumerate(devices):
+        h = health.get(dev.get("name"))
+        if device_health.is_due(h):
+            due.append(idx)
+        else:
+            results[idx].update(status="circuit_open", skipped=True,
+                                error=f"circuit open after {h.health_consecutive_failures} failures, next probe at {h.health_next_retry_on}")
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="biometric-fetch")
+    try:
+        pending = {
+            executor.submit(_timed_fetch, idx, devices[idx], cursors.get(devices[idx].get("name")), started): idx
+            for idx in due
         }
+        while pending:
+            done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for fut in done:
+                idx = pending.pop(fut)
+                res = results[idx]
+                res["elapsed"] = round(now - started.get(idx, now), 3)
+                try:
+                    res.update(fut.result())
+                    res["records"] = len(res["logs"])
+                    res["status"] = "ok"
+                except Exception as e:
+                    res["status"] = "error"
+                    res["error"] = str(e)
+            for fut, idx in list(pending.items()):
+                begun, limit = started.get(idx), deadlines[idx]
+                if begun is not None and limit is not None and now - begun > limit:
+                    pending.pop(fut)
+                    results[idx]["elapsed"] = round(now - begun, 3)
+                    results[idx]["error"] = f"no response within {limit:g}s"
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for idx in due:
+        res = results[idx]
+        try:
+            device_health.record_fetch_result(res, health.get(res["name"]), settings)
+        except Exception as e:
+            log_error(f"record_fetch_result failed for {res['device']} - {e}", "Device Health")
+        if res["status"] != "ok":
+            log_error(f"fetch_from_devices failed for {res['device']} - {res['error']}", "Device Fetch")
+    return results
+
+def make_record(ip, log, ts):
+    """Staged JSON form of a pyzk Attendance log; ``ts`` is the formatted timestamp."""
+    return {
+        "uid": getattr(log, "uid", None),
+        "user_id": str(log.user_id),
+        "timestamp": ts,
+        "punch": getattr(log, "punch", None),
+        "punch_type": PUNCH_MAPPING.get(log.punch, "Unknown"),
+        "device_ip": ip,
+    }
 
-        existing.append(rec)
-        existing_keys.add(key)
-        new_records.append(rec)
+def process_attendance_logs(ip, logs, durable=False):
+    """
+    Stage the logs not seen before and return their records. Membership is
+    checked against the persistent punch index (see punch_index), so a punch
+    staged on any earlier date is skipped too.
 
-    if new_records:
-        save_attendance_data(ip, existing)
+    Failures raise: nothing is staged and the claim is rolled back, so the
+    logs stay new. ``durable`` fsyncs the writes before returning.
+    """
+    if not logs:
+        return []
+
+    records = {}
+    for log in logs:
+        ts = get_datetime(log.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        records.setdefault((str(log.user_id), ts), (log, ts))
+
+    with punch_index.claim() as index:
+        new_records = [
+            make_record(ip, log, ts)
+            for (user_id, ts), (log, _) in records.items()
+            if index.add(ip, user_id, ts)
+        ]
+        stage_records(ip, new_records, durable=durable)
 
     return new_records
+
+# ------------------------------------------------
+# Historical backfill
+# ------------------------------------------------
+def get_backfill_dir(ip):
+    """Backfill partitions live apart from the day files so cleanup never touches them."""
+    return os.path.join(BACKFILL_DIR, ip)
+
+def get_backfill_partition_path(ip, date):
+    return os.path.join(get_backfill_dir(ip), f"{getdate(date).strftime('%Y-%m-%d')}.json")
+
+def load_backfill_partition(ip, date):
+    path = get_backfill_partition_path(ip, date)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+def sync_all_historical_data(ip, port=4370, from_date=None, to_date=None):
+    """
+    Pull the full device log and write the records inside [from_date, to_date]
+    (either bound optional) into one durable JSON partition per punch date.
+    Out-of-window logs are dropped while iterating, before any record is built.
+
+    Returns {"YYYY-MM-DD": record count} for the partitions written. Raises if
+    the device cannot be read.
+    """
+    from_str = getdate(from_date).strftime("%Y-%m-%d") if from_date else None
+    to_str = getdate(to_date).strftime("%Y-%m-%d") if to_date else None
+
+    partitions = {}
+    logs = fetch_device_logs(ip, port)
+    for log in logs:
+        ts = get_datetime(log.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        day = ts[:10]
+        if (from_str and day < from_str) or (to_str and day > to_str):
+            continue
+        partitions.setdefault(day, {})[(str(log.user_id), ts)] = make_record(ip, log, ts)
+    del logs
+
+    os.makedirs(get_backfill_dir(ip), exist_ok=True)
+    for day, records in partitions.items():
+        write_json_file(get_backfill_partition_path(ip, day), list(records.values()), durable=True)
+
+    return {day: len(records) for day, records in sorted(partitions.items())}
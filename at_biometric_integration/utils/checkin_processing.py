@@ -1,79 +1,353 @@
 # at_biometric_integration/utils/checkin_processing.py
+import os
+
 import frappe
-from .helpers import log_error
-from frappe.utils import get_datetime
-from .biometric_sync import load_attendance_data
+from . import dirty_attendance
+from .helpers import chunked, log_error, get_sync_settings
+from .employee_cache import get_active_employee, get_employee_map
+from .punch_coalesce import coalesce_punches
+from frappe.utils import get_datetime, now_datetime
+from frappe.model.naming import parse_naming_series
+from .biometric_sync import (
+    COALESCE_DIR,
+    append_attendance_records,
+    get_attendance_file_path,
+    get_pending_partitions,
+    load_checkin_cursor,
+    load_manifest,
+    read_attendance_records,
+    save_checkin_cursor,
+)
+
+CHECKIN_BULK_CHUNK = 1000
+# unique (employee, time), added by patches/add_employee_checkin_indexes
+CHECKIN_UNIQUE_INDEX = "unique_employee_time"
+
 
+def create_frappe_checkins_from_devices(devices, reports=None):
+    """
+    Create checkins from the records staged since the last run. Each device
+    keeps a staging-to-checkin cursor (byte offset per punch-date partition);
+    only records past it are mapped, deduped and inserted, one punch date at a
+    time, and the cursors move after the commit. An idle device costs one
+    manifest read and a stat per partition.
 
-def create_frappe_checkins_from_devices(devices):
+    With a "Punch Coalesce Window" set, each date's records from all devices
+    are first run through coalesce_punches. Only records read in the same
+    call are merged: the live listener comes through here with each batch of
+    events, so copies of a swipe that reach it in one batch are coalesced,
+    while a copy staged after its partner became a checkin is inserted too.
+
+    Pass a list as ``reports`` to collect the per-batch counts.
+    """
     created = []
+    advanced = {}
+    batches = {}
 
     for dev in devices:
         ip = dev.device_ip
-        records = load_attendance_data(ip)
+        cursor = load_checkin_cursor(ip)
+        pending = get_pending_partitions(ip, cursor)
+        if not pending:
+            continue
+        for date, offset in pending.items():
+            records, cursor[date] = read_attendance_records(get_attendance_file_path(ip, date), offset)
+            batches.setdefault(date, {})[ip] = records
+        advanced[ip] = cursor
+
+    if not advanced:
+        return created
+
+    window = get_sync_settings().punch_coalesce_window
+    for date in sorted(batches):
+        by_device = batches[date]
+        dropped = {}
+        if window and len(by_device) > 1:
+            by_device, merged = coalesce_punches(by_device, window)
+            log_coalesced_punches(date, merged)
+            for _, gone in merged:
+                dropped[gone["device_ip"]] = dropped.get(gone["device_ip"], 0) + 1
+        for ip, records in by_device.items():
+            report = {}
+            created.extend(create_checkins_from_records(ip, records, commit=False, report=report))
+            report["coalesced"] = dropped.get(ip, 0)
+            if reports is not None:
+                reports.append(report)
+
+    frappe.db.commit()
+
+    for ip, cursor in advanced.items():
+        # forget partitions that cleanup removed
+        manifest = load_manifest(ip)
+        save_checkin_cursor(ip, {d: o for d, o in cursor.items() if d in manifest})
+
+    return created
+
+
+def log_coalesced_punches(date, merged):
+    """Append the (kept, dropped) provenance of merged punches to the date's coalesce log."""
+    if not merged:
+        return
+    try:
+        os.makedirs(COALESCE_DIR, exist_ok=True)
+        append_attendance_records(
+            os.path.join(COALESCE_DIR, f"{date}.jsonl"),
+            [
+                {
+                    "user_id": kept.get("user_id"),
+                    "kept": {"device_ip": kept.get("device_ip"), "uid": kept.get("uid"), "timestamp": kept.get("timestamp")},
+                    "dropped": {"device_ip": gone.get("device_ip"), "uid": gone.get("uid"), "timestamp": gone.get("timestamp")},
+                }
+                for kept, gone in merged
+            ]
+        )
+    except Exception as e:
+        log_error(e, "log_coalesced_punches")
+
+
+def create_checkins_from_records(ip, records, commit=True, report=None, mark_dirty=True):
+    """
+    Map staged punch records of one device to employees and insert the
+    Employee Checkins that do not exist yet. Shared by the batch pipeline and
+    the live-capture listener so both dedupe and insert the same way.
+
+    The batch is validated in memory, then written with chunked bulk inserts
+    (see insert_checkins_bulk) unless "Bulk Checkin Insert" is switched off in
+    Attendance Settings. ``report``, when given, is filled with the batch
+    counts: records, inserted, skipped_existing, skipped_unmapped,
+    skipped_invalid, failed. Callers that recompute the attendance of the
+    batch themselves (backfill) pass ``mark_dirty=False``.
+    """
+    report = report if report is not None else {}
+    report.update({
+        "device": ip, "records": len(records or []), "inserted": 0, "skipped_existing": 0,
+        "skipped_unmapped": 0, "skipped_invalid": 0, "failed": 0,
+    })
+    if not records:
+        return []
+
+    rows = prepare_checkin_batch(ip, records, report)
+
+    if get_sync_settings().bulk_checkin_insert:
+        inserted = insert_checkins_bulk(rows, report)
+    else:
+        inserted = insert_checkins_per_doc(rows, report)
+    created = list(inserted)
+    report["inserted"] = len(created)
+    if created and mark_dirty:
+        # bulk inserts run no document hooks, so the rows are marked here;
+        # rows the database dropped as existing changed nothing
+        dirty_attendance.mark_checkins(inserted.values())
+
+    if report["inserted"] or report["failed"]:
+        frappe.logger().info(
+            f"[Biometric Checkins] {ip}: {report['records']} records, {report['inserted']} inserted, "
+            f"{report['skipped_existing']} existing, {report['skipped_unmapped']} unmapped, "
+            f"{report['skipped_invalid']} invalid, {report['failed']} failed"
+        )
+
+    if created and commit:
+        frappe.db.commit()
 
-        if not records:
+    return created
+
+
+def prepare_checkin_batch(ip, records, report):
+    """
+    Validate a batch in memory: resolve employees from the cached device id
+    map (employee_cache), drop unparseable, unmapped and already existing
+    punches (also within the batch). Returns the checkin rows to insert, as
+    dicts of Employee Checkin fields.
+    """
+    emp_map = get_employee_map()
+
+    valid = []
+    for r in records:
+        try:
+            ts = get_datetime(r["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
+        except Exception:
+            report["skipped_invalid"] += 1
+            continue
+        emp = get_active_employee(r.get("user_id"), emp_map)
+        if not emp:
+            report["skipped_unmapped"] += 1
+            continue
+        valid.append((emp, ts, r))
+
+    # when needed, existence is checked per punch date and only for the employees in the
+    # batch, so each query stays a day wide and is served by the
+    # (employee, time) index (patches/add_employee_checkin_indexes)
+    days = {}
+    for emp, ts, _ in valid:
+        day = days.setdefault(ts[:10], {"employees": set(), "timestamps": []})
+        day["employees"].add(emp.name)
+        day["timestamps"].append(ts)
+
+    # with the unique key in place the database dedupes on insert and the
+    # read-before-write is skipped; without it (duplicates blocked the
+    # constraint) fall back to reading
+    existing = set()
+    if not has_unique_checkin_key():
+        for day in days.values():
+            existing.update(get_existing_checkins(day["employees"], min(day["timestamps"]), max(day["timestamps"])))
+
+    rows = []
+    for emp, ts, r in valid:
+        key = (emp.name, ts)
+        if key in existing:
+            report["skipped_existing"] += 1
             continue
+        existing.add(key)
+
+        punch = r.get("punch")
+        rows.append({
+            "employee": emp.name,
+            "employee_name": emp.employee_name,
+            "time": ts,
+            "log_type": "IN" if punch in (0, 4) else "OUT",
+            "device_id": r.get("uid"),
+            "device_ip": ip,
+            "latitude": "0.0",
+            "longitude": "0.0",
+        })
+
+    return rows
+
 
-        user_ids = list({r["user_id"] for r in records})
+def has_unique_checkin_key():
+    """Whether Employee Checkin carries the unique ingestion key (cached until the next migrate)."""
+    return bool(frappe.cache().get_value(
+        "biometric_checkin_unique_key",
+        generator=lambda: int(frappe.db.has_index("tabEmployee Checkin", CHECKIN_UNIQUE_INDEX))
+    ))
 
-        employees = frappe.get_all(
-            "Employee",
+
+def get_existing_checkins(employees, from_time, to_time):
+    """(employee, "YYYY-MM-DD HH:MM:SS") of the checkins of ``employees`` in the window."""
+    existing = set()
+    for chunk in chunked(sorted(employees)):
+        existing_checkins = frappe.get_all(
+            "Employee Checkin",
             filters={
-                "attendance_device_id": ["in", user_ids],
-                "status": "Active"
+                "employee": ["in", chunk],
+                "time": ["between", [from_time, to_time]]
             },
-            fields=["name", "attendance_device_id"]
+            fields=["employee", "time"]
+        )
+        existing.update(
+            (c.employee, c.time.strftime("%Y-%m-%d %H:%M:%S"))
+            for c in existing_checkins
         )
+    return existing
 
-        emp_map = {e.attendance_device_id: e.name for e in employees}
-        timestamps = [r["timestamp"] for r in records]
-
-        existing = set()
-        if timestamps:
-            existing_checkins = frappe.get_all(
-                "Employee Checkin",
-                filters={
-                    "time": ["between", [min(timestamps), max(timestamps)]]
-                },
-                fields=["employee", "time"]
-            )
-
-            existing = {
-                (c.employee, c.time.strftime("%Y-%m-%d %H:%M:%S"))
-                for c in existing_checkins
-            }
-
-        for r in records:
-            emp = emp_map.get(r["user_id"])
-            if not emp:
-                continue
 
-            key = (emp, r["timestamp"])
-            if key in existing:
+def insert_checkins_per_doc(rows, report):
+    """
+    Full document insert per row: validation, naming and every hook. A row
+    the unique key rejects was inserted concurrently and counts as existing.
+    Returns {name: row} of the rows inserted.
+    """
+    created = {}
+    for row in rows:
+        frappe.db.savepoint("biometric_checkin_row")
+        try:
+            d = frappe.get_doc(dict(row, doctype="Employee Checkin")).insert(ignore_permissions=True)
+            created[d.name] = row
+        except Exception as e:
+            frappe.db.rollback(save_point="biometric_checkin_row")
+            if frappe.db.is_unique_key_violation(e):
+                report["skipped_existing"] += 1
                 continue
+            report["failed"] += 1
+            log_error(e, "Employee Checkin Insert")
+    return created
 
-            punch = r.get("punch")
-            log_type = "IN" if punch in (0, 4) else "OUT"
 
-            try:
-                d = frappe.get_doc({
-                    "doctype": "Employee Checkin",
-                    "employee": emp,
-                    "time": r["timestamp"],
-                    "log_type": log_type,
-                    "device_id": r.get("uid"),
-                    "device_ip": ip,
-                    "latitude": "0.0",
-                    "longitude": "0.0",
-                }).insert(ignore_permissions=True)
+def insert_checkins_bulk(rows, report):
+    """
+    Write pre-validated rows with frappe.db.bulk_insert, CHECKIN_BULK_CHUNK at a
+    time. Names come from one series reservation per chunk (see
+    reserve_series).
 
-                created.append(d.name)
+    Document hooks do not run. The only side effects the attendance pipeline
+    relies on are the stored employee, time and log_type, and employee_name is
+    filled here; the shift fields set by HRMS' validate are left empty
+    (switch off "Bulk Checkin Insert" if something depends on them). A chunk
+    the database rejects is retried row by row through insert_checkins_per_doc.
 
-            except Exception as e:
-                log_error(e, "Employee Checkin Insert")
+    Rows are written insert-or-ignore: with the unique key a punch inserted
+    by a concurrent run is dropped by the database and counted as existing.
+    Which rows landed is read back by name, one query per chunk. Returns
+    {name: row} of the rows inserted.
+    """
+    if not rows:
+        return {}
 
-    if created:
-        frappe.db.commit()
+    meta = frappe.get_meta("Employee Checkin")
+    fields = [f for f in rows[0] if meta.has_field(f)]
+    now = now_datetime()
+    user = frappe.session.user
+    columns = ["name", "owner", "modified_by", "creation", "modified", "docstatus", "idx"] + fields
 
+    created = {}
+    for start in range(0, len(rows), CHECKIN_BULK_CHUNK):
+        chunk = rows[start:start + CHECKIN_BULK_CHUNK]
+        names = allocate_names("Employee Checkin", len(chunk))
+        values = [
+            [name, user, user, now, now, 0, 0] + [row[f] for f in fields]
+            for name, row in zip(names, chunk)
+        ]
+        frappe.db.savepoint("biometric_checkin_chunk")
+        try:
+            # chunks are already CHECKIN_BULK_CHUNK rows; bulk_insert's own
+            # chunk_size argument only exists from v15 on
+            frappe.db.bulk_insert("Employee Checkin", columns, values, ignore_duplicates=True)
+            inserted = set(frappe.get_all("Employee Checkin", filters={"name": ["in", names]}, pluck="name"))
+            report["skipped_existing"] += len(names) - len(inserted)
+            created.update((n, row) for n, row in zip(names, chunk) if n in inserted)
+        except Exception as e:
+            frappe.db.rollback(save_point="biometric_checkin_chunk")
+            log_error(f"bulk checkin insert failed, retrying {len(chunk)} rows one by one - {e}", "Employee Checkin Insert")
+            created.update(insert_checkins_per_doc(chunk, report))
     return created
+
+
+def allocate_names(doctype, count):
+    """
+    ``count`` document names for ``doctype``. Series-named doctypes
+    (``PREFIX-.YYYY.-.#####`` or ``naming_series:``) get one block reserved
+    in tabSeries under a row lock (see reserve_series);
+    anything else falls back to hashes.
+    """
+    meta = frappe.get_meta(doctype)
+    key = meta.autoname or ""
+    if key.startswith("naming_series:"):
+        field = meta.get_field("naming_series")
+        key = (field and (field.default or (field.options or "").split("\n")[0])) or ""
+
+    if "." not in key or not key.rsplit(".", 1)[1].startswith("#"):
+        return [frappe.generate_hash(length=10) for _ in range(count)]
+
+    prefix_key, hashes = key.rsplit(".", 1)
+    prefix = parse_naming_series(prefix_key)
+    start = reserve_series(prefix, count)
+    return [f"{prefix}{str(n).zfill(len(hashes))}" for n in range(start, start + count)]
+
+
+def reserve_series(prefix, count):
+    """
+    Advance the series ``prefix`` by ``count`` and return the first reserved
+    number. The tabSeries row stays locked until the caller's transaction
+    ends, exactly as with Frappe's own getseries on every document insert,
+    so other inserts of the doctype wait for the pipeline commit; it does
+    not commit itself, which would also commit the half-done batch ahead of
+    the staging cursors. A rolled back batch gives its numbers back.
+    """
+    current = frappe.db.sql("SELECT `current` FROM `tabSeries` WHERE `name`=%s FOR UPDATE", (prefix,))
+    if current and current[0][0] is not None:
+        frappe.db.sql("UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name`=%s", (count, prefix))
+        start = int(current[0][0]) + 1
+    else:
+        frappe.db.sql("INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)", (prefix, count))
+        start = 1
+    return start
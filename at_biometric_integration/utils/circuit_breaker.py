@@ -0,0 +1,25 @@
+# at_biometric_integration/utils/circuit_breaker.py
+"""Circuit breaker arithmetic of device_health, which owns the state and passes the time in."""
+from datetime import datetime
+
+HEALTHY = "Healthy"
+DEGRADED = "Degraded"
+CIRCUIT_OPEN = "Circuit Open"
+
+BACKOFF_BASE_MINUTES = 5  # one scheduler interval
+
+
+def is_due(health, now):
+    """False while the device's circuit is open and its next probe is not due yet."""
+    if not health or health.health_status != CIRCUIT_OPEN or not health.health_next_retry_on:
+        return True
+    retry_on = health.health_next_retry_on
+    if not isinstance(retry_on, datetime):
+        retry_on = datetime.fromisoformat(str(retry_on))
+    return retry_on <= now
+
+
+def backoff_minutes(failures, threshold, max_minutes):
+    """Wait before the next probe: one interval at the threshold, doubling per failed probe."""
+    exponent = max(0, failures - threshold)
+    return min(BACKOFF_BASE_MINUTES * (2 ** min(exponent, 16)), max_minutes)
@@ -2,24 +2,40 @@
 import os
 import frappe
 from frappe.utils import nowdate
-from .biometric_sync import ATTENDANCE_DIR
+from .biometric_sync import (
+    ATTENDANCE_DIR, COALESCE_DIR, PARTITION_DIR, get_partition_dir, load_manifest, get_manifest_path, write_json_file,
+    load_checkin_cursor, save_checkin_cursor,
+)
 from .helpers import log_error
+from . import punch_index
+
+# the device cursors keep full downloads rare; keys older than this are only
+# needed if a device still holds that history and the cursor falls back
+PUNCH_INDEX_RETAIN_DAYS = 400
 
 def cleanup_old_attendance_logs(retain_days=7):
     """
-    Remove attendance_<ip>_<date>.json files older than retain_days
+    Remove staged punch partitions and coalesce logs whose punch date is
+    older than retain_days, and legacy attendance_<ip>_<fetch date>.json(l) files by their date.
     """
     try:
         if not os.path.exists(ATTENDANCE_DIR):
             return
         cutoff = frappe.utils.add_days(nowdate(), -retain_days)
+        if os.path.isdir(PARTITION_DIR):
+            for ip in os.listdir(PARTITION_DIR):
+                cleanup_partitions(ip, cutoff)
+        if os.path.isdir(COALESCE_DIR):
+            for filename in os.listdir(COALESCE_DIR):
+                if filename.split(".")[0] < str(cutoff):
+                    os.remove(os.path.join(COALESCE_DIR, filename))
         for filename in os.listdir(ATTENDANCE_DIR):
-            if filename.endswith(".json"):
-                # filename pattern: attendance_<ip>_YYYY-MM-DD.json
+            if filename.endswith((".jsonl", ".json")):
+                # filename pattern: attendance_<ip>_YYYY-MM-DD.jsonl
                 parts = filename.split("_")
                 if len(parts) < 3:
                     continue
-                date_part = parts[-1].replace(".json", "")
+                date_part = parts[-1].split(".")[0]
                 try:
                     if date_part < cutoff:
                         os.remove(os.path.join(ATTENDANCE_DIR, filename))
@@ -28,3 +44,26 @@ def cleanup_old_attendance_logs(retain_days=7):
                     continue
     except Exception as e:
         log_error(e, "cleanup_old_attendance_logs")
+
+def cleanup_partitions(ip, cutoff):
+    """Drop the partitions of ``ip`` dated before ``cutoff`` and their manifest and checkin cursor entries."""
+    # under the staging lock so a concurrent append cannot recreate the manifest entry;
+    # the cursor entry goes too, or a partition recreated by late punches would
+    # be read from the old file's offset
+    cutoff = str(cutoff)
+    with punch_index.claim():
+        for filename in os.listdir(get_partition_dir(ip)):
+            if filename.endswith(".jsonl") and filename.split(".")[0] < cutoff:
+                os.remove(os.path.join(get_partition_dir(ip), filename))
+        manifest = load_manifest(ip)
+        write_json_file(get_manifest_path(ip), {d: e for d, e in manifest.items() if d >= cutoff})
+        cursor = load_checkin_cursor(ip)
+        if any(d < cutoff for d in cursor):
+            save_checkin_cursor(ip, {d: o for d, o in cursor.items() if d >= cutoff})
+
+def prune_punch_index(retain_days=PUNCH_INDEX_RETAIN_DAYS):
+    """Drop dedupe index keys older than retain_days."""
+    try:
+        punch_index.prune(frappe.utils.add_days(nowdate(), -retain_days))
+    except Exception as e:
+        log_error(e, "prune_punch_index")
@@ -0,0 +1,225 @@
+# at_biometric_integration/utils/device_client.py
+"""
+Raw device I/O over pyzk.
+
+Nothing in this module may touch ``frappe``: these functions run inside
+worker threads of the concurrent fetch stage, where ``frappe.local`` (and
+with it the DB connection) is not available. Errors are raised, never
+logged; the caller logs them from the main thread.
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+from zk import ZK
+from zk.attendance import Attendance
+
+from .helpers import fsync_dir  # plain os calls, safe in the fetch threads
+
+DEFAULT_PORT = 4370
+DEFAULT_TIMEOUT = 10
+
+
+def connect_device(ip, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, force_udp=False, ommit_ping=False):
+    """Open a pyzk connection to the device. Raises on failure."""
+    zk = ZK(ip, port=int(port or DEFAULT_PORT), timeout=timeout, force_udp=force_udp, ommit_ping=ommit_ping)
+    return zk.connect()
+
+
+def safe_disconnect(conn):
+    try:
+        conn.disconnect()
+    except Exception:
+        # the socket is dropped either way; nothing useful to report
+        pass
+
+
+def fetch_device_logs(ip, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, **connect_kwargs):
+    """Return every attendance log held by the device. Raises on failure."""
+    conn = connect_device(ip, port, timeout, **connect_kwargs)
+    try:
+        return conn.get_attendance()
+    finally:
+        safe_disconnect(conn)
+
+
+# ------------------------------------------------
+# Incremental download (record-count watermark)
+# ------------------------------------------------
+def _ts(value):
+    if not value:
+        return None
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)[:19]
+
+
+def make_cursor(logs):
+    """Cursor describing the device buffer after ``logs`` were read."""
+    if not logs:
+        return {"record_count": 0, "last_uid": None, "last_timestamp": None}
+    last = logs[-1]
+    return {
+        "record_count": len(logs),
+        "last_uid": str(getattr(last, "uid", "") or ""),
+        "last_timestamp": _ts(last.timestamp),
+    }
+
+
+def logs_past_cursor(logs, cursor):
+    """
+    Return the logs appended after ``cursor`` was taken.
+
+    The device buffer is append-only until it is cleared, so when the record
+    at the old watermark still matches, everything after it is new. If it does
+    not match (buffer cleared and refilled) fall back to the last timestamp;
+    equal timestamps are kept and left to the staging dedupe.
+    """
+    count = int((cursor or {}).get("record_count") or 0)
+    if not count or count > len(logs):
+        return logs
+
+    last = logs[count - 1]
+    if str(getattr(last, "uid", "") or "") == str(cursor.get("last_uid") or "") \
+            and _ts(last.timestamp) == _ts(cursor.get("last_timestamp")):
+        return logs[count:]
+
+    last_ts = _ts(cursor.get("last_timestamp"))
+    if not last_ts:
+        return logs
+    return [log for log in logs if _ts(log.timestamp) >= last_ts]
+
+
+def fetch_new_device_logs(ip, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, cursor=None, **connect_kwargs):
+    """
+    Read the device record count first and only download when it moved.
+
+    Returns {"logs": logs past the cursor, "cursor": new cursor or None when
+    nothing changed, "skipped": bool, "device_records": count on the device}.
+    Raises on failure.
+    """
+    conn = connect_device(ip, port, timeout, **connect_kwargs)
+    try:
+        conn.read_sizes()
+        device_records = conn.records
+        if cursor and device_records == int(cursor.get("record_count") or 0):
+            return {"logs": [], "cursor": None, "skipped": True, "device_records": device_records}
+
+        logs = conn.get_attendance() if device_records else []
+        return {
+            "logs": logs_past_cursor(logs, cursor),
+            "cursor": make_cursor(logs),
+            "skipped": False,
+            "device_records": len(logs),
+        }
+    finally:
+        safe_disconnect(conn)
+
+
+# ------------------------------------------------
+# Drain-and-clear (clear_from_device_on_fetch)
+# ------------------------------------------------
+# A drain moves through these states; the state of an interrupted drain is
+# recoverable from the journal file name alone:
+#
+#   (no journal)         device untouched, nothing to recover
+#   <stem>.pending.jsonl journal durable on disk, device may still hold the
+#                        records (clear not confirmed)
+#   <stem>.cleared.jsonl device cleared, the journal is the only copy
+#   (journal removed)    records staged durably by the caller
+#
+# Both journal states are recovered the same way: replay into staging, then
+# delete. Replaying a pending journal is harmless because staging dedupes.
+JOURNAL_PENDING = "pending"
+JOURNAL_CLEARED = "cleared"
+
+
+def write_journal(path, logs):
+    """Atomically write ``logs`` to ``path`` and fsync file and directory."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        for log in logs:
+            f.write(json.dumps({
+                "uid": getattr(log, "uid", None),
+                "user_id": str(log.user_id),
+                "timestamp": _ts(log.timestamp),
+                "status": getattr(log, "status", None),
+                "punch": getattr(log, "punch", None),
+            }) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(path))
+
+
+def read_journal(path):
+    """Journal lines back as pyzk Attendance objects."""
+    logs = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            logs.append(Attendance(
+                r["user_id"],
+                datetime.strptime(r["timestamp"], "%Y-%m-%d %H:%M:%S"),
+                r.get("status"),
+                r.get("punch"),
+                r.get("uid"),
+            ))
+    return logs
+
+
+def journal_path(journal_dir, ip, state):
+    stem = f"drain_{ip}_{int(time.time() * 1000)}_{os.getpid()}"
+    return os.path.join(journal_dir, f"{stem}.{state}.jsonl")
+
+
+def drain_device_logs(ip, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, journal_dir=None, **connect_kwargs):
+    """
+    Download every record, journal it durably, verify, then clear the device.
+
+    The device is disabled for the whole cycle so no punch can land between the
+    download and the clear. The clear is only sent once the journal is fsynced,
+    holds exactly the downloaded number of records, and the device still reports
+    that same count. Any mismatch raises before clearing.
+
+    Returns {"logs", "journal" (path of the cleared journal or None), "cursor",
+    "skipped", "device_records"}. Raises on failure.
+    """
+    conn = connect_device(ip, port, timeout, **connect_kwargs)
+    try:
+        conn.disable_device()
+        try:
+            logs = conn.get_attendance()
+            if not logs:
+                return {"logs": [], "journal": None, "cursor": make_cursor([]), "skipped": False, "device_records": 0}
+
+            pending = journal_path(journal_dir, ip, JOURNAL_PENDING)
+            write_journal(pending, logs)
+
+            journaled = len(read_journal(pending))
+            conn.read_sizes()
+            if journaled != len(logs) or conn.records != len(logs):
+                raise ValueError(
+                    f"drain verification failed for {ip}: downloaded {len(logs)}, "
+                    f"journaled {journaled}, device reports {conn.records}; device not cleared"
+                )
+
+            conn.clear_attendance()
+            cleared = pending.replace(f".{JOURNAL_PENDING}.", f".{JOURNAL_CLEARED}.")
+            os.replace(pending, cleared)
+            fsync_dir(journal_dir)
+        finally:
+            conn.enable_device()
+
+        return {
+            "logs": logs,
+            "journal": cleared,
+            "cursor": make_cursor([]),
+            "skipped": False,
+            "device_records": len(logs),
+        }
+    finally:
+        safe_disconnect(conn)
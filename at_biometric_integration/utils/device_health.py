@@ -0,0 +1,90 @@
+# at_biometric_integration/utils/device_health.py
+"""
+Per-device health and circuit breaker for the fetch stage.
+
+Every fetch outcome is written to the device's Biometric Device Settings
+record (last success, consecutive failures, latency, records fetched). Once a
+device has failed ``device_failure_threshold`` runs in a row its circuit
+opens: the fetch stage leaves it out until ``health_next_retry_on``, then
+lets a single probe through. A failed probe doubles the wait (capped at
+``device_backoff_max`` minutes); a successful one closes the circuit.
+
+Only called from the main thread; the worker threads never see this module.
+"""
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+
+from . import circuit_breaker
+from .circuit_breaker import CIRCUIT_OPEN, DEGRADED, HEALTHY, backoff_minutes
+from .helpers import get_sync_settings
+
+HEALTH_FIELDS = [
+    "health_status",
+    "health_consecutive_failures",
+    "health_last_success_on",
+    "health_last_failure_on",
+    "health_last_latency_ms",
+    "health_last_records_fetched",
+    "health_next_retry_on",
+    "health_last_error",
+]
+
+
+def get_device_health(device_names):
+    """Health rows keyed by Biometric Device Settings name."""
+    names = [n for n in device_names if n]
+    if not names:
+        return {}
+    rows = frappe.get_all(
+        "Biometric Device Settings",
+        filters={"name": ["in", names]},
+        fields=["name"] + HEALTH_FIELDS
+    )
+    return {r.name: r for r in rows}
+
+
+def is_due(health, now=None):
+    """False while the device's circuit is open and its next probe is not due yet."""
+    return circuit_breaker.is_due(health, now or now_datetime())
+
+
+def record_fetch_result(res, health=None, settings=None):
+    """
+    Update the device health fields from a fetch_from_devices result. Returns
+    the values written.
+    """
+    name = res.get("name")
+    if not name:
+        return None
+
+    settings = settings or get_sync_settings()
+    now = now_datetime()
+    latency = int(res["elapsed"] * 1000) if res.get("elapsed") is not None else None
+
+    if res["status"] == "ok":
+        values = {
+            "health_status": HEALTHY,
+            "health_consecutive_failures": 0,
+            "health_last_success_on": now,
+            "health_last_latency_ms": latency,
+            "health_last_records_fetched": res.get("records") or 0,
+            "health_next_retry_on": None,
+            "health_last_error": None,
+        }
+    else:
+        failures = cint((health or {}).get("health_consecutive_failures")) + 1
+        values = {
+            "health_consecutive_failures": failures,
+            "health_last_failure_on": now,
+            "health_last_latency_ms": latency,
+            "health_last_error": (res.get("error") or res["status"])[:500],
+        }
+        if failures >= settings.device_failure_threshold:
+            wait = backoff_minutes(failures, settings.device_failure_threshold, settings.device_backoff_max)
+            values["health_status"] = CIRCUIT_OPEN
+            values["health_next_retry_on"] = add_to_date(now, minutes=wait)
+        else:
+            values["health_status"] = DEGRADED
+
+    frappe.db.set_value("Biometric Device Settings", name, values, update_modified=False)
+    return values
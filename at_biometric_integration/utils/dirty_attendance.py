@@ -0,0 +1,178 @@
+# at_biometric_integration/utils/dirty_attendance.py
+"""
+Set of (employee, date) pairs whose attendance inputs changed since the last
+recompute, kept in Redis as "employee|YYYY-MM-DD" members.
+
+Fed by:
+
+    checkins       bulk ingestion (checkin_processing) and the Employee
+                   Checkin doc_events for everything else
+    regularization Attendance Regularization submit / cancel
+    leave          Leave Application submit / cancel
+    holidays       Holiday List dates added or removed, for its employees,
+                   and an Employee moving to another holiday list
+
+attendance_processing.process_dirty_attendance() recomputes only these
+pairs; the nightly full sweep (process_attendance_realtime) reconciles
+anything a hook could not see. Dates after today are never marked, so no
+attendance is created ahead of time.
+
+A run holds RUN_LOCK_KEY for its whole claim-recompute-commit cycle, so
+runs never overlap (the sync endpoint and the scheduler can both start
+one); a run that finds the lock held does nothing and leaves the marks for
+the next. Under the lock the set is renamed to PROCESSING_KEY, so marks
+arriving during the run land in a fresh set. The claimed pairs are dropped
+after commit, or put back when the run fails; pairs left by a run that
+died are put back by the next run to take the lock.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+
+import frappe
+from frappe.utils import get_datetime, getdate
+from redis.exceptions import LockError, ResponseError
+
+from .helpers import get_sync_settings, log_error
+
+DIRTY_KEY = "biometric_attendance_dirty"
+PROCESSING_KEY = "biometric_attendance_dirty_processing"
+RUN_LOCK_KEY = "biometric_attendance_dirty_run"
+RUN_LOCK_TIMEOUT = 60 * 60
+
+
+def _key(name):
+    return frappe.cache().make_key(name)
+
+
+def mark(pairs):
+    """Add (employee, date) pairs to the set."""
+    today = getdate()
+    members = {
+        f"{employee}|{getdate(date)}"
+        for employee, date in pairs
+        if employee and date and getdate(date) <= today
+    }
+    if members:
+        frappe.cache().sadd(DIRTY_KEY, *members)
+
+
+def mark_range(employee, from_date, to_date):
+    """Mark every day of from_date..to_date (capped at today) for one employee."""
+    day, last = getdate(from_date), min(getdate(to_date), getdate())
+    pairs = []
+    while day <= last:
+        pairs.append((employee, day))
+        day += timedelta(days=1)
+    mark(pairs)
+
+
+def mark_checkins(rows):
+    """Mark the days of checkin rows (dicts with employee and time)."""
+    mark((r["employee"], get_datetime(r["time"]).date()) for r in rows)
+
+
+@contextmanager
+def claim():
+    """
+    Take the current set for processing; yields [(employee, date)], empty
+    when nothing is marked or another run holds the lock. The pairs are
+    dropped when the block exits cleanly and put back when it raises, so
+    the block should commit before it ends.
+    """
+    cache = frappe.cache()
+    lock = cache.lock(_key(RUN_LOCK_KEY), timeout=RUN_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        yield []
+        return
+
+    try:
+        # pairs a crashed run left behind go back into the set first
+        restore()
+        try:
+            cache.rename(_key(DIRTY_KEY), _key(PROCESSING_KEY))
+        except ResponseError:
+            # no such key: nothing marked since the last run
+            yield []
+            return
+
+        pairs = []
+        for member in cache.smembers(PROCESSING_KEY):
+            member = member.decode() if isinstance(member, bytes) else member
+            employee, _, date = member.rpartition("|")
+            pairs.append((employee, getdate(date)))
+
+        try:
+            yield pairs
+        except BaseException:
+            restore()
+            raise
+        cache.delete(_key(PROCESSING_KEY))
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # expired mid-run; the next run restores whatever is left
+            log_error("dirty attendance run outlived its lock", "Dirty Attendance")
+
+
+def restore():
+    """Return claimed pairs to the set (the run did not complete)."""
+    cache = frappe.cache()
+    cache.sunionstore(_key(DIRTY_KEY), [_key(DIRTY_KEY), _key(PROCESSING_KEY)])
+    cache.delete(_key(PROCESSING_KEY))
+
+
+# ------------------------------------------------
+# doc_events handlers (hooks.py)
+# ------------------------------------------------
+def on_checkin_change(doc, method=None):
+    pairs = [(doc.employee, get_datetime(doc.time).date())] if doc.employee and doc.time else []
+    before = doc.get_doc_before_save() if method == "on_update" else None
+    if before and before.employee and before.time:
+        pairs.append((before.employee, get_datetime(before.time).date()))
+    mark(pairs)
+
+
+def on_regularization_change(doc, method=None):
+    if doc.employee and doc.date:
+        mark([(doc.employee, doc.date)])
+
+
+def on_employee_change(doc, method=None):
+    """A new holiday list changes the status of the days where the old and new lists differ."""
+    before = doc.get_doc_before_save()
+    if not before or before.get("holiday_list") == doc.get("holiday_list"):
+        return
+
+    def holiday_dates(holiday_list):
+        if not holiday_list:
+            return set()
+        return {
+            getdate(d) for d in frappe.get_all(
+                "Holiday", filters={"parent": holiday_list, "parenttype": "Holiday List"}, pluck="holiday_date"
+            )
+        }
+
+    changed = holiday_dates(before.holiday_list) ^ holiday_dates(doc.holiday_list)
+    # older days are past draft reprocessing (submitted attendance keeps its status)
+    max_age = get_sync_settings().draft_reprocess_max_age_days
+    earliest = getdate() - timedelta(days=max_age) if max_age else None
+    mark((doc.name, date) for date in changed if not earliest or date >= earliest)
+
+
+def on_leave_change(doc, method=None):
+    mark_range(doc.employee, doc.from_date, doc.to_date)
+
+
+def on_holiday_list_change(doc, method=None):
+    before = doc.get_doc_before_save()
+    old_dates = {getdate(h.holiday_date) for h in (before.holidays if before else [])}
+    new_dates = {getdate(h.holiday_date) for h in doc.holidays}
+    changed = old_dates ^ new_dates
+    if not changed:
+        return
+
+    employees = frappe.get_all(
+        "Employee", filters={"holiday_list": doc.name, "status": "Active"}, pluck="name"
+    )
+    mark((employee, date) for employee in employees for date in changed)
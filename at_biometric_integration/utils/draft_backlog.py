@@ -0,0 +1,48 @@
+# at_biometric_integration/utils/draft_backlog.py
+"""
+Watermark of the draft Attendance backlog for the full sweep
+(attendance_processing.reprocess_draft_backlog): per draft, the fingerprint
+of the inputs it was last found up to date with and when that was, in a
+Redis hash keyed by Attendance name.
+
+A draft is settled when a recompute finds nothing to write. It is only
+recomputed again once its fingerprint changes (new punches, a leave or
+holiday change, a different shift or an edit of the draft itself).
+Drafts that need work are taken least recently checked first, a batch per
+run, so a large backlog is worked through over several runs.
+"""
+import frappe
+from frappe.utils import now
+
+INDEX_KEY = "biometric_draft_backlog"
+
+
+def load_index():
+    """{attendance_name: {"employee", "fingerprint", "checked_on"}}"""
+    index = frappe.cache().hgetall(INDEX_KEY) or {}
+    return {
+        (name.decode() if isinstance(name, bytes) else name): entry
+        for name, entry in index.items()
+    }
+
+
+def select_due(drafts, fingerprints, index, batch_size):
+    """The drafts whose fingerprint differs from the settled one, at most batch_size."""
+    due = [
+        att for att in drafts
+        if (index.get(att.name) or {}).get("fingerprint") != fingerprints[att.name]
+    ]
+    due.sort(key=lambda att: (index.get(att.name) or {}).get("checked_on") or "")
+    return due[:batch_size]
+
+
+def settle(name, employee, fingerprint):
+    frappe.cache().hset(INDEX_KEY, name, {"employee": employee, "fingerprint": fingerprint, "checked_on": now()})
+
+
+def prune(live_names, index):
+    """Drop the entries of ``index`` whose drafts were submitted, deleted or aged out."""
+    cache = frappe.cache()
+    for name in index:
+        if name not in live_names:
+            cache.hdel(INDEX_KEY, name)
@@ -0,0 +1,88 @@
+# at_biometric_integration/utils/employee_cache.py
+"""
+Site-wide map of attendance_device_id -> Employee (name, employee_name,
+company, status), used to resolve device user ids during ingestion without
+querying Employee.
+
+Two layers:
+
+    Redis    the map, stored under a key that carries a version token
+    process  the last map this process used, with its version
+
+A lookup reads only the version token from Redis (bypassing frappe's
+request-local cache, so the long-running listener sees changes too). The
+Employee doc_events in hooks.py replace the token on any change that can
+affect the map, which makes every process rebuild or refetch on its next
+lookup.
+"""
+import frappe
+
+# helpers imports holiday_cache; a module import keeps the cycle lazy
+from . import helpers
+
+VERSION_KEY = "biometric_employee_map_version"
+MAP_KEY = "biometric_employee_map"
+MAP_TTL = 24 * 60 * 60
+WATCHED_FIELDS = ("attendance_device_id", "status", "company", "employee_name")
+
+_process_cache = {}
+
+
+def build_employee_map():
+    employees = frappe.get_all(
+        "Employee",
+        filters={"attendance_device_id": ["is", "set"]},
+        fields=["name", "employee_name", "company", "status", "attendance_device_id"],
+        order_by="modified asc"
+    )
+    emp_map = {}
+    for e in employees:
+        key = str(e.attendance_device_id).strip()
+        # an id reused after someone left belongs to the active employee
+        if key in emp_map and emp_map[key]["status"] == "Active" and e.status != "Active":
+            continue
+        emp_map[key] = frappe._dict({
+            "name": e.name,
+            "employee_name": e.employee_name,
+            "company": e.company,
+            "status": e.status,
+        })
+    return emp_map
+
+
+def get_employee_map():
+    """{attendance_device_id: {"name", "employee_name", "company", "status"}}"""
+    version = helpers.get_version_token(VERSION_KEY)
+    site = getattr(frappe.local, "site", None)
+    cached = _process_cache.get(site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    key = f"{MAP_KEY}:{version}"
+    emp_map = frappe.cache().get_value(key)
+    if emp_map is None:
+        emp_map = build_employee_map()
+        frappe.cache().set_value(key, emp_map, expires_in_sec=MAP_TTL)
+
+    _process_cache[site] = (version, emp_map)
+    return emp_map
+
+
+def get_active_employee(device_user_id, emp_map=None):
+    """
+    Map entry of the active employee with this attendance_device_id, else
+    None. Pass ``emp_map`` (from get_employee_map) when resolving a batch.
+    """
+    emp = (emp_map if emp_map is not None else get_employee_map()).get(str(device_user_id).strip())
+    if emp and emp.status == "Active":
+        return emp
+    return None
+
+
+def invalidate(doc=None, method=None, *args):
+    """Employee doc_events handler; also callable directly."""
+    if doc is not None and method == "on_update":
+        before = doc.get_doc_before_save()
+        if before and not any(before.get(f) != doc.get(f) for f in WATCHED_FIELDS):
+            return
+    helpers.replace_version_token(VERSION_KEY)
@@ -1,7 +1,8 @@
 import frappe
-from at_biometric_integration.utils.attendance_processing import process_attendance_realtime, auto_submit_due_attendances
+from at_biometric_integration.utils.attendance_processing import auto_submit_due_attendances
+from at_biometric_integration.utils.attendance_shards import recompute_attendance
 
-def run_fix():
+def run_fix(shards=None):
     print("Starting Attendance Fix...")
     from frappe.utils import getdate, add_days
     
@@ -18,8 +19,13 @@ def run_fix():
     
     print(f"Recalculating attendance for all active employees from {from_date} to {to_date}...")
     try:
-        updated = process_attendance_realtime(from_date, to_date)
-        print(f"Processed {len(updated)} attendance records entries (Created/Updated).")
+        # shards > 1 (argument or Attendance Settings) splits the range over parallel background jobs
+        result = recompute_attendance(from_date, to_date, shards=shards)
+        if result.get("run_id"):
+            print(f"Queued {result['shards']} shards (run {result['run_id']}); "
+                  f"see attendance_shards.get_run_summary('{result['run_id']}') when they finish.")
+        else:
+            print(f"Processed {result['processed']} attendance records entries (Created/Updated), {result.get('unchanged', 0)} unchanged.")
     except Exception as e:
         print(f"Error during recalculation: {e}")
         frappe.log_error(e, "Fix Past Attendance Recalculation")
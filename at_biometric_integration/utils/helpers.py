@@ -1,4 +1,6 @@
 # at_biometric_integration/utils/helpers.py
+import os
+
 import frappe
 from datetime import timedelta
 from frappe.utils import (
@@ -10,6 +12,46 @@ from frappe.utils import (
     getdate,
 )
 
+from . import holiday_cache
+from .attendance_rules import build_leave_index, find_leave
+
+EMPLOYEE_IN_CHUNK = 500
+
+def chunked(items, size=EMPLOYEE_IN_CHUNK):
+    """``items`` in lists of at most ``size``, for IN filters; [None] (no filter) when ``items`` is None."""
+    if items is None:
+        return [None]
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# ------------------------------------------------
+# Durable writes
+# ------------------------------------------------
+def fsync_dir(path):
+    """fsync a directory, so an entry just created or renamed in it survives a crash."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ------------------------------------------------
+# Cache version tokens (employee_cache, holiday_cache)
+# ------------------------------------------------
+def get_version_token(key):
+    """The token under Redis ``key``, read past frappe's request-local cache; created on first use."""
+    cache = frappe.cache()
+    version = cache.get(cache.make_key(key))
+    if version is None:
+        version = frappe.generate_hash(length=8)
+        cache.set(cache.make_key(key), version)
+    return version.decode() if isinstance(version, bytes) else str(version)
+
+def replace_version_token(key):
+    """Give ``key`` a new token, so every process rebuilds what it cached under the old one."""
+    cache = frappe.cache()
+    cache.set(cache.make_key(key), frappe.generate_hash(length=8))
+
 # ------------------------------------------------
 # Logging helper
 # ------------------------------------------------
@@ -45,15 +87,46 @@ def get_attendance_settings():
             "max_regularization_days": 3
         })
 
+def get_sync_settings():
+    """Device sync and processing knobs, kept on Attendance Settings alongside the attendance rules."""
+    defaults = frappe._dict({
+        "device_fetch_concurrency": 8,
+        "device_fetch_deadline": 30,
+        "device_failure_threshold": 3,
+        "device_backoff_max": 60,
+        "bulk_checkin_insert": 1,
+        "punch_coalesce_window": 0,
+        "draft_reprocess_max_age_days": 60,
+        "draft_reprocess_batch_size": 500,
+        "attendance_recompute_shards": 1,
+    })
+    try:
+        s = frappe.get_single("Attendance Settings")
+    except Exception as e:
+        log_error(e, "Load Sync Settings")
+        return defaults
+    return frappe._dict({
+        "device_fetch_concurrency": cint(getattr(s, "device_fetch_concurrency", 0)) or defaults.device_fetch_concurrency,
+        "device_fetch_deadline": cint(getattr(s, "device_fetch_deadline", 0)) or defaults.device_fetch_deadline,
+        "device_failure_threshold": cint(getattr(s, "device_failure_threshold", 0)) or defaults.device_failure_threshold,
+        "device_backoff_max": cint(getattr(s, "device_backoff_max", 0)) or defaults.device_backoff_max,
+        "bulk_checkin_insert": cint(getattr(s, "bulk_checkin_insert", defaults.bulk_checkin_insert)),
+        "punch_coalesce_window": cint(getattr(s, "punch_coalesce_window", 0)),
+        # 0 is a valid setting (no cap); only a never-saved field falls back
+        "draft_reprocess_max_age_days": defaults.draft_reprocess_max_age_days
+            if getattr(s, "draft_reprocess_max_age_days", None) in (None, "")
+            else cint(s.draft_reprocess_max_age_days),
+        "draft_reprocess_batch_size": cint(getattr(s, "draft_reprocess_batch_size", 0)) or defaults.draft_reprocess_batch_size,
+        "attendance_recompute_shards": cint(getattr(s, "attendance_recompute_shards", 0)) or defaults.attendance_recompute_shards,
+    })
+
 # ------------------------------------------------
 # Holidays & Leave
 # ------------------------------------------------
 def is_holiday(employee, date):
+    """Whether ``date`` is in the employee's Holiday List (served from holiday_cache)."""
     try:
-        holiday_list = frappe.get_value("Employee", employee, "holiday_list")
-        if not holiday_list:
-            return False
-        return frappe.db.exists("Holiday", {"parent": holiday_list, "holiday_date": date})
+        return holiday_cache.is_holiday(employee, date)
     except Exception as e:
         log_error(e, "is_holiday")
         return False
@@ -114,11 +187,16 @@ def get_last_checkout_from_previous_days(employee, current_date, max_lookback_da
     
     return None
 
-def get_leave_status(employee, date):
+def get_leave_status(employee, date, leave_index=None):
     """
     returns tuple: (status_str_or_None, leave_type_or_None, leave_app_name_or_None)
     status_str: "On Leave" / "Half Day"
+    Pass ``leave_index`` (from load_leave_index, covering the date) to look
+    the leave up in memory instead of querying.
     """
+    if leave_index is not None:
+        entry = leave_index.get(employee)
+        return _leave_status(find_leave(entry, getdate(date)) if entry else None)
     try:
         leaves = frappe.get_all(
             "Leave Application",
@@ -131,14 +209,45 @@ def get_leave_status(employee, date):
             fields=["name", "leave_type", "half_day"],
             limit_page_length=1
         )
-        if leaves:
-            half = bool(leaves[0].get("half_day"))
-            return ("Half Day" if half else "On Leave", leaves[0].leave_type, leaves[0].name)
-        return (None, None, None)
+        return _leave_status(leaves[0] if leaves else None)
     except Exception as e:
         log_error(e, "get_leave_status")
         return (None, None, None)
 
+def _leave_status(leave):
+    if not leave:
+        return (None, None, None)
+    half = bool(leave.get("half_day"))
+    return ("Half Day" if half else "On Leave", leave.leave_type, leave.name)
+
+def load_leave_index(from_date, to_date, employees=None):
+    """
+    Approved Leave Applications overlapping from_date..to_date, read in one
+    query (chunked when ``employees`` is given), as {employee:
+    attendance_rules.LeaveEntry} for find_leave.
+    """
+    if employees is not None and not employees:
+        return {}
+
+    leaves = []
+    for chunk in chunked(None if employees is None else sorted(employees)):
+        filters = {
+            "from_date": ["<=", getdate(to_date)],
+            "to_date": [">=", getdate(from_date)],
+            "status": "Approved"
+        }
+        if chunk:
+            filters["employee"] = ["in", chunk]
+        leaves.extend(frappe.get_all(
+            "Leave Application",
+            filters=filters,
+            fields=["name", "employee", "leave_type", "half_day", "from_date", "to_date", "modified"]
+        ))
+
+    for leave in leaves:
+        leave.from_date, leave.to_date = getdate(leave.from_date), getdate(leave.to_date)
+    return build_leave_index(leaves)
+
 # ------------------------------------------------
 # Shift helpers
 # ------------------------------------------------
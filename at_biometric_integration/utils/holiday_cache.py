@@ -0,0 +1,74 @@
+# at_biometric_integration/utils/holiday_cache.py
+"""
+Site-wide holiday calendar for helpers.is_holiday: each Holiday List as a
+frozenset of its dates, and each Employee's holiday_list.
+
+Same layering as employee_cache: the calendar sits in Redis under a key
+that carries a version token, and each process keeps the last calendar it
+used. The Holiday List and Employee doc_events in hooks.py replace the
+token, so every process reloads on its next lookup.
+"""
+import frappe
+from frappe.utils import getdate
+
+# helpers imports this module; a module import keeps the cycle lazy
+from . import helpers
+
+VERSION_KEY = "biometric_holiday_calendar_version"
+CALENDAR_KEY = "biometric_holiday_calendar"
+CALENDAR_TTL = 24 * 60 * 60
+
+_process_cache = {}
+
+
+def build_holiday_calendar():
+    employees = frappe.get_all(
+        "Employee",
+        filters={"holiday_list": ["is", "set"]},
+        fields=["name", "holiday_list"]
+    )
+    holidays = frappe.get_all(
+        "Holiday",
+        filters={"parenttype": "Holiday List"},
+        fields=["parent", "holiday_date"]
+    )
+    lists = {}
+    for h in holidays:
+        lists.setdefault(h.parent, set()).add(getdate(h.holiday_date))
+    return frappe._dict({
+        "employees": {e.name: e.holiday_list for e in employees},
+        "lists": {name: frozenset(dates) for name, dates in lists.items()},
+    })
+
+
+def get_holiday_calendar():
+    """{"employees": {employee: holiday_list}, "lists": {holiday_list: frozenset(dates)}}"""
+    version = helpers.get_version_token(VERSION_KEY)
+    site = getattr(frappe.local, "site", None)
+    cached = _process_cache.get(site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    key = f"{CALENDAR_KEY}:{version}"
+    calendar = frappe.cache().get_value(key)
+    if calendar is None:
+        calendar = build_holiday_calendar()
+        frappe.cache().set_value(key, calendar, expires_in_sec=CALENDAR_TTL)
+
+    _process_cache[site] = (version, calendar)
+    return calendar
+
+
+def is_holiday(employee, date):
+    calendar = get_holiday_calendar()
+    holiday_list = calendar.employees.get(employee)
+    return bool(holiday_list) and getdate(date) in calendar.lists.get(holiday_list, ())
+
+
+def invalidate(doc=None, method=None, *args):
+    """Holiday List and Employee doc_events handler; also callable directly."""
+    if doc is not None and doc.doctype == "Employee" and method == "on_update":
+        before = doc.get_doc_before_save()
+        if before and before.get("holiday_list") == doc.get("holiday_list"):
+            return
+    helpers.replace_version_token(VERSION_KEY)
@@ -0,0 +1,183 @@
+# at_biometric_integration/utils/live_capture.py
+"""
+Long-running listener that streams punches from the devices as they happen.
+
+One thread per device holds a pyzk ``live_capture`` connection and pushes
+events onto a queue. The main thread (the only one with a DB connection)
+stages them through the same path as the batch pipeline
+(process_attendance_logs dedupes against the staging store), then turns the
+staged partitions into checkins with create_frappe_checkins_from_devices,
+which advances the staging-to-checkin cursor, so the pipeline does not
+insert the same punches again.
+
+The persisted device cursor belongs to the scheduled incremental fetch and
+is never written here: a live event does not prove that every record
+before it was read (a punch between the catch-up and the live connection
+never arrives as an event), and the listener's copy goes stale as soon as
+the scheduler moves on. The listener keeps its own in-memory cursor,
+advanced by catch-ups only, and the scheduled fetch picks up whatever the
+listener missed; staging dedupes the overlap.
+
+Devices that refuse live events are polled with the incremental cursor
+fetch instead. Every (re)connect starts with a cursor catch-up, so punches
+made while the connection was down are not lost.
+
+Started with ``bench --site <site> biometric-listen``.
+"""
+import queue
+import signal
+import threading
+import time
+
+import frappe
+from zk.exception import ZKErrorResponse
+
+from . import biometric_sync, checkin_processing
+from .device_client import connect_device, fetch_new_device_logs, safe_disconnect
+from .helpers import log_error
+
+LIVE_TIMEOUT = 1          # seconds pyzk waits for an event before yielding None
+BACKOFF_START = 1
+BACKOFF_MAX = 60
+BATCH_WAIT = 0.2          # seconds to gather more events into one DB batch
+
+
+class DeviceListener(threading.Thread):
+    """Per-device thread. Must not call frappe (see device_client)."""
+
+    def __init__(self, dev, events, cursors, stop, poll_interval):
+        super().__init__(name=f"biometric-listen-{dev.device_ip}", daemon=True)
+        self.dev = dev
+        self.events = events
+        self.cursors = cursors
+        self.stop = stop
+        self.poll_interval = poll_interval
+        self.polling = False
+        self.conn = None
+
+    def run(self):
+        backoff = BACKOFF_START
+        while not self.stop.is_set():
+            try:
+                self.catch_up()
+                if self.polling:
+                    self.stop.wait(self.poll_interval)
+                else:
+                    self.listen()
+                backoff = BACKOFF_START
+            except Exception as e:
+                self.report(error=f"{type(e).__name__}: {e}")
+                self.stop.wait(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX)
+
+    def catch_up(self):
+        res = fetch_new_device_logs(
+            self.dev.device_ip, self.dev.device_port or 4370,
+            cursor=self.cursors.get(self.dev.name)
+        )
+        if not res["skipped"]:
+            self.report(**res)
+
+    def listen(self):
+        self.conn = connect_device(self.dev.device_ip, self.dev.device_port or 4370)
+        try:
+            capture = self.conn.live_capture(new_timeout=LIVE_TIMEOUT)
+            for att in capture:
+                if self.stop.is_set():
+                    self.conn.end_live_capture = True
+                    continue
+                if att is not None:
+                    self.report(logs=[att])
+        except ZKErrorResponse as e:
+            # firmware without realtime events: fall back to polling for good
+            self.polling = True
+            self.report(error=f"live capture unsupported, polling every {self.poll_interval}s: {e}")
+        finally:
+            safe_disconnect(self.conn)
+            self.conn = None
+
+    def report(self, logs=None, cursor=None, error=None, **kwargs):
+        self.events.put({
+            "device": self.dev.device_ip,
+            "name": self.dev.name,
+            "logs": logs or [],
+            "cursor": cursor,
+            "error": error,
+        })
+
+
+def run_listener(device_names=None, poll_interval=30):
+    """Run until SIGTERM / Ctrl-C. Blocks the calling (frappe-connected) thread."""
+    filters = {"name": ["in", device_names]} if device_names else {}
+    devices = frappe.get_all("Biometric Device Settings", filters=filters, fields=["name", "device_ip", "device_port"])
+    if not devices:
+        print("No biometric devices configured")
+        return
+
+    # the listeners' catch-up cursors, seeded from the saved ones; shared with
+    # the threads, only this thread writes, after staging succeeded
+    cursors = biometric_sync.get_device_cursors([d.name for d in devices])
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def _stop(*args):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+
+    listeners = [DeviceListener(d, events, cursors, stop, poll_interval) for d in devices]
+    for listener in listeners:
+        listener.start()
+    print(f"Listening to {len(listeners)} device(s)")
+
+    try:
+        while not stop.is_set():
+            try:
+                batch = [events.get(timeout=1)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + BATCH_WAIT
+            while time.monotonic() < deadline:
+                try:
+                    batch.append(events.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            process_events(batch, cursors)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for listener in listeners:
+            listener.join(timeout=LIVE_TIMEOUT * 3)
+
+
+def process_events(batch, cursors):
+    """
+    Stage a batch of listener events, then create checkins on the main thread.
+    Only the in-memory ``cursors`` move, on catch-ups; the saved device cursor
+    is left to the scheduled fetch (see the module docstring).
+    """
+    staged = set()
+    for res in batch:
+        ip = res["device"]
+        if res["error"]:
+            # connection churn is expected on a long-running listener; keep it out of Error Log
+            frappe.logger().warning(f"[Biometric Listener] {ip}: {res['error']}")
+            continue
+        try:
+            if biometric_sync.process_attendance_logs(ip, res["logs"]):
+                staged.add(ip)
+            if res["cursor"]:
+                cursors[res["name"]] = dict(cursors.get(res["name"]) or {}, **res["cursor"])
+        except Exception as e:
+            log_error(f"biometric listener {ip}: {e}", "Biometric Listener")
+
+    if not staged:
+        return
+    try:
+        devices = [frappe._dict(device_ip=ip) for ip in sorted(staged)]
+        for name in checkin_processing.create_frappe_checkins_from_devices(devices):
+            frappe.logger().info(f"[Biometric Listener] created {name}")
+    except Exception as e:
+        frappe.db.rollback()
+        log_error(f"biometric listener checkins: {e}", "Biometric Listener")
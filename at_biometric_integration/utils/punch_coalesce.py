@@ -0,0 +1,50 @@
+# at_biometric_integration/utils/punch_coalesce.py
+"""Cross-device punch coalescing for the checkin stage ("Punch Coalesce Window" in Attendance Settings)."""
+from datetime import datetime
+
+
+def coalesce_punches(by_device, window):
+    """
+    Merge one swipe registered by several devices. ``by_device`` maps device
+    ip to its staged records; returns the same shape without the merged
+    copies, plus a list of (kept, dropped) record pairs.
+
+    A single sweep over all records sorted by (user_id, timestamp): a punch
+    opens a cluster, and a punch of the same user on a device not yet in the
+    cluster within ``window`` seconds of its first punch is folded into it.
+    The earliest punch survives and lists the others under "coalesced_from".
+    Repeat punches on the same device are never merged; a repeat opens a new
+    cluster. Records without a parseable timestamp are kept as they are.
+    """
+    punches = []
+    for ip, records in by_device.items():
+        for r in records:
+            try:
+                dt = datetime.strptime(r["timestamp"], "%Y-%m-%d %H:%M:%S")
+            except (KeyError, TypeError, ValueError):
+                dt = None
+            punches.append((str(r.get("user_id")), r.get("timestamp") or "", ip, dt, r))
+    punches.sort(key=lambda p: (p[0], p[1]))
+
+    kept = {ip: [] for ip in by_device}
+    merged = []
+    anchor = None
+    for user_id, _, ip, dt, r in punches:
+        r.setdefault("device_ip", ip)
+        in_cluster = bool(
+            anchor and dt and anchor["user_id"] == user_id
+            and (dt - anchor["dt"]).total_seconds() <= window
+        )
+        if in_cluster and ip not in anchor["devices"]:
+            anchor["devices"].add(ip)
+            anchor["record"].setdefault("coalesced_from", []).append(
+                {"device_ip": ip, "uid": r.get("uid"), "timestamp": r.get("timestamp")}
+            )
+            merged.append((anchor["record"], r))
+            continue
+        # a repeat on a device already in the cluster is a new swipe and
+        # anchors the cluster its copies on other devices belong to
+        anchor = {"user_id": user_id, "dt": dt, "devices": {ip}, "record": r} if dt else None
+        kept[ip].append(r)
+
+    return kept, merged
@@ -0,0 +1,119 @@
+# at_biometric_integration/utils/punch_index.py
+"""
+Persistent dedupe index of staged punches: one sqlite file per site holding
+every (device, user_id, timestamp) that has been written to the staging
+store.
+
+Membership is a primary-key lookup, so staging costs scale with the new
+punches of a run instead of the size of the day file, and a punch already
+staged on an earlier date is still recognised. sqlite keeps only its page
+cache in memory and nothing is rebuilt at startup; the staging files are
+scanned once, when the index file is first created (user_version marks
+the seed as done).
+
+Writers take the database lock (BEGIN IMMEDIATE) for the whole claim-and-
+append step, so the scheduler, the sync endpoint and the listener cannot
+both stage the same punch. WAL mode keeps readers unblocked meanwhile.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import frappe
+
+INDEX_DIR = ("private", "biometric")
+INDEX_NAME = "punch_index.sqlite3"
+BUSY_TIMEOUT = 30
+
+_connections = {}
+
+
+def get_index_path():
+    return frappe.get_site_path(*INDEX_DIR, INDEX_NAME)
+
+
+def _connect():
+    path = get_index_path()
+    conn = _connections.get(path)
+    if conn is not None:
+        return conn
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS punch ("
+        " device TEXT NOT NULL, user_id TEXT NOT NULL, timestamp TEXT NOT NULL,"
+        " PRIMARY KEY (device, user_id, timestamp)) WITHOUT ROWID"
+    )
+    if not conn.execute("PRAGMA user_version").fetchone()[0]:
+        _seed_from_staging(conn)
+    _connections[path] = conn
+    return conn
+
+
+def _seed_from_staging(conn):
+    """Load the keys of the staging files present when the index is created."""
+    from .biometric_sync import iter_attendance_records, iter_staged_files, migrate_legacy_files
+
+    migrate_legacy_files()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for ip, path in iter_staged_files():
+            conn.executemany(
+                "INSERT OR IGNORE INTO punch VALUES (?, ?, ?)",
+                (
+                    (r.get("device_ip") or ip, str(r.get("user_id")), str(r.get("timestamp")))
+                    for r in iter_attendance_records(path)
+                )
+            )
+        conn.execute("PRAGMA user_version = 1")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class PunchClaim:
+    """Handle passed to the body of claim(); see there."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add(self, device, user_id, timestamp):
+        """Record the punch; True if it was not in the index yet."""
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO punch VALUES (?, ?, ?)", (device, str(user_id), str(timestamp))
+        )
+        return cur.rowcount == 1
+
+
+@contextmanager
+def claim():
+    """
+    Transaction for staging new punches. Keys added inside the block only
+    become permanent when it exits cleanly; if the staging write raises, the
+    claim is rolled back and the punches stay new for the next run.
+    """
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield PunchClaim(conn)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def prune(before):
+    """Drop keys with a timestamp before ``before`` (YYYY-MM-DD). Returns the row count removed."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute("DELETE FROM punch WHERE timestamp < ?", (str(before),))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return cur.rowcount